@@ -2,8 +2,160 @@ import streamlit as st
 import pandas as pd
 from datetime import datetime
 import os
+import time
 
-from arbitrage_core import find_opportunities, discover_best_seller_categories
+from arbitrage_core import (sort_opportunities, rows_to_columns, response_cache, ScanMetrics, EBAY_CONCURRENCY, AMAZON_BLOCK_RESOURCES,
+                            HISTORY_ENABLED, HISTORY_FRESH_FOR, MATCH_THRESHOLD)
+from scan_worker import JobQueue, delta_from_dict
+
+RESULT_COLS = ["title","amazon_price","ebay_price","ebay_shipping","ebay_total_price","estimated_ebay_fee",
+               "est_profit_gbp","est_margin_pct","sold_recent","prime","rating","reviews",
+               "amazon_url","ebay_url","asin","category_url","category_urls","image_url"]
+
+# sidebar settings that only change evaluation (applied to finished scans instantly) vs. ones that need new fetches
+FILTER_KEYS = ("min_profit", "min_margin", "min_sold_recent", "ebay_fee_rate", "ebay_fixed_fee")
+SCRAPE_KEYS = ("categories", "discover", "max_items", "max_ebay_results", "query_words", "match_threshold")
+
+def results_frame(results) -> pd.DataFrame:
+    df = pd.DataFrame(rows_to_columns(results))
+    df["category_urls"] = df["category_urls"].map(" | ".join)
+    return df[RESULT_COLS]
+
+@st.cache_resource
+def job_queue() -> JobQueue:
+    return JobQueue()
+
+def render_diagnostics(metrics, rate_limits=None):
+    with st.expander("Run diagnostics", expanded=False):
+        totals = metrics.stage_totals()
+        if totals:
+            st.markdown("**Time per stage (s, summed over threads)**")
+            st.bar_chart(pd.Series(totals, name="seconds"))
+            st.dataframe(pd.DataFrame(metrics.stages()), use_container_width=True)
+        counters = metrics.counters()
+        if counters:
+            st.markdown("**Counters**")
+            st.dataframe(pd.DataFrame([{"name": c["name"], "labels": ", ".join(f"{k}={v}" for k, v in c["labels"].items()),
+                                        "value": c["value"]} for c in counters]), use_container_width=True)
+        if rate_limits:
+            st.markdown("**Per-host rate limits at the end of the scan (adaptive, req/s)**")
+            st.dataframe(pd.DataFrame([dict(host=h, **v) for h, v in rate_limits.items()]), use_container_width=True)
+        c1, c2 = st.columns(2)
+        c1.download_button("Metrics (JSON)", data=metrics.to_json(), file_name="scan_metrics.json", mime="application/json")
+        c2.download_button("Metrics (Prometheus)", data=metrics.to_prometheus(), file_name="scan_metrics.prom", mime="text/plain")
+
+def render_delta(delta):
+    if delta is None:
+        return
+    if delta.previous_scan_id is None:
+        st.caption("Change report: no earlier complete scan of these categories to compare with yet.")
+        return
+    with st.expander(f"Changes since last scan: {len(delta.new)} new, {len(delta.dropped)} dropped, "
+                     f"{len(delta.moved)} price-moved", expanded=bool(delta.new or delta.dropped or delta.moved)):
+        if delta.new:
+            st.markdown("**New opportunities**")
+            st.dataframe(results_frame(delta.new), use_container_width=True)
+        if delta.dropped:
+            st.markdown("**Dropped opportunities**")
+            st.dataframe(results_frame(delta.dropped), use_container_width=True)
+        if delta.moved:
+            st.markdown("**Price-moved opportunities**")
+            st.dataframe(pd.DataFrame([{
+                "title": after.title, "asin": after.asin,
+                "amazon_price_before": before.amazon_price, "amazon_price_now": after.amazon_price,
+                "ebay_total_before": before.ebay_total_price, "ebay_total_now": after.ebay_total_price,
+                "profit_before": before.est_profit_gbp, "profit_now": after.est_profit_gbp,
+                "profit_change": round((after.est_profit_gbp or 0.0) - (before.est_profit_gbp or 0.0), 2),
+            } for before, after in delta.moved]), use_container_width=True)
+
+def render_results(results, n_categories: int, complete: bool):
+    if not results:
+        if complete:
+            st.info("No items matched your filters. Lower the thresholds or try different categories.")
+        return
+    df = results_frame(results)
+    if complete:
+        st.success(f"Found {len(df)} comparative opportunities across {n_categories} categories")
+    else:
+        st.warning(f"Partial results: {len(df)} opportunities found before the scan stopped")
+    st.dataframe(df, use_container_width=True, height=500)
+
+    csv = df.to_csv(index=False)
+    ts = datetime.now().strftime("%Y%m%d_%H%M")
+    st.download_button("Download CSV report", data=csv, file_name=f"comparative_report_{ts}.csv", mime="text/csv")
+
+@st.cache_resource(max_entries=4, show_spinner=False)
+def load_candidates(job_id: int, _queue: JobQueue):
+    return _queue.candidates(job_id)
+
+def refilter(job, candidates, view: dict):
+    """A finished scan's rows under the current sidebar thresholds, computed from its cached candidates."""
+    thresholds = [view[k] for k in FILTER_KEYS]
+    t0 = time.perf_counter()
+    rows = candidates.filter(*thresholds, avoid_keywords=view["avoid_keywords"])
+    elapsed_ms = (time.perf_counter() - t0) * 1000
+    if any(view[k] != job.params.get(k) for k in FILTER_KEYS + ("avoid_keywords",)):
+        st.caption(f"Re-filtered {len(candidates)} scanned products with the current sidebar thresholds "
+                   f"in {elapsed_ms:.0f} ms (no re-scraping).")
+    undetermined = candidates.undetermined(*thresholds, avoid_keywords=view["avoid_keywords"])
+    if undetermined:
+        st.info(f"{undetermined} products might pass these thresholds, but the scan skipped one of their eBay lookups "
+                f"under its own, stricter filters. Queue a new scan (optionally with 'Fetch all eBay signals') to check them.")
+    removed = {k.lower() for k in job.params.get("avoid_keywords") or []} - {k.lower() for k in view["avoid_keywords"]}
+    if removed:
+        st.info(f"Products matching the removed avoid keywords ({', '.join(sorted(removed))}) were never scanned. "
+                f"Queue a new scan to include them.")
+    return rows
+
+def render_job(job, queue: JobQueue, view: dict):
+    """Final state of a finished scan job: status, rows (re-filtered with `view`), change report and diagnostics."""
+    summary = job.summary or {}
+    if job.status == "failed":
+        st.error(f"Scan stopped early: {job.error}")
+    elif job.status == "cancelled":
+        st.warning("Scan cancelled")
+    if summary.get("products") is not None:
+        st.caption(f"Scanned {summary['products']} unique products; {summary['duplicate_asins']} repeat ASINs skipped and "
+                   f"{summary['coalesced_requests']} identical eBay queries shared ({summary['requests_saved']} requests saved); "
+                   f"{summary['fetches_pruned']} eBay fetches pruned by filters"
+                   + (f"; {summary['history_reused']} answered from price history" if job.params.get("incremental") else ""))
+    page_stats = summary.get("amazon_pages") or {}
+    if page_stats.get("pages"):
+        st.caption(f"Amazon pages: {page_stats['pages']} fetched, avg load {page_stats['avg_load_ms']:.0f} ms, "
+                   f"{page_stats['bytes_loaded'] / 1e6:.1f} MB loaded, {page_stats['requests_blocked']} requests blocked "
+                   f"(~{page_stats['est_bytes_saved'] / 1e6:.1f} MB saved)")
+    metrics = ScanMetrics.from_dict(job.metrics) if job.metrics else None
+    if metrics is not None and (metrics.counter("cache_hits") or metrics.counter("cache_misses")):
+        st.caption(f"eBay response cache: {metrics.counter('cache_hits'):.0f} hits / "
+                   f"{metrics.counter('cache_misses'):.0f} misses")
+    n_categories = summary.get("categories") or len(job.params.get("categories") or []) or job.params.get("discover", 0)
+    if any(view.get(k) != job.params.get(k) for k in SCRAPE_KEYS):
+        st.caption("Categories, item limits or query settings differ from this scan; queue a new scan to apply them.")
+    candidates = load_candidates(job.job_id, queue) if job.status == "done" else None
+    rows = refilter(job, candidates, view) if candidates is not None else queue.rows(job.job_id)
+    render_results(sort_opportunities(rows), n_categories, job.status == "done")
+    render_delta(delta_from_dict(job.delta))
+    if metrics is not None:
+        render_diagnostics(metrics, summary.get("rate_limits"))
+
+@st.fragment(run_every=2)
+def render_live_job(job_id: int, queue: JobQueue):
+    """Polls a queued/running job; reruns the whole page once it has finished."""
+    job = queue.get(job_id)
+    if job is None or not job.active:
+        st.rerun()
+    if job.status == "queued":
+        ahead = sum(1 for j in queue.jobs(limit=50) if j.active and j.job_id < job_id)
+        st.info(f"Scan #{job_id} is queued" + (f" behind {ahead} other scan(s)" if ahead else "") + ".")
+    else:
+        st.progress(job.progress, text=job.progress_text or "Scanning categories, checking eBay demand/price, estimating profit...")
+    if job.cancel_requested:
+        st.caption("Cancelling...")
+    elif st.button("Cancel scan", key=f"cancel_{job_id}"):
+        queue.cancel(job_id)
+    rows = queue.rows(job_id)
+    if rows:
+        st.dataframe(results_frame(sort_opportunities(rows)), use_container_width=True, height=500)
 
 st.set_page_config(page_title="Amazon ↔ eBay Comparative Analysis (UK)", page_icon="📊", layout="wide")
 
@@ -30,6 +182,7 @@ with st.sidebar:
         cats_text = st.text_area("Amazon Best Sellers URLs (one per line)", height=160, placeholder="https://www.amazon.co.uk/gp/bestsellers/electronics\nhttps://www.amazon.co.uk/gp/bestsellers/kitchen")
 
     st.subheader("Filters")
+    st.caption("Filter, fee and avoid-keyword changes re-apply to the scan shown on the right instantly.")
     min_profit = st.number_input("Min profit (£)", min_value=0.0, max_value=1000.0, value=0.0, step=0.5)
     min_margin = st.slider("Min margin (%)", min_value=0, max_value=50, value=0, step=1)
     min_sold = st.slider("Min 'sold recently' (eBay)", min_value=0, max_value=200, value=0, step=1)
@@ -40,47 +193,84 @@ with st.sidebar:
     max_items = st.slider("Max Amazon items per category", min_value=10, max_value=200, value=30, step=10)
     max_ebay_results = st.slider("Max eBay results to scan", min_value=3, max_value=20, value=8, step=1)
     query_words = st.slider("Use first N title words for eBay query", min_value=4, max_value=20, value=8, step=1)
+    match_threshold = st.slider("Min eBay title match (0 = off)", min_value=0.0, max_value=1.0,
+                                value=float(MATCH_THRESHOLD), step=0.05,
+                                help="eBay listings whose title is less similar to the Amazon title are ignored")
     avoid = st.text_input("Avoid keywords (comma-separated)", value="Apple iPhone,Nike,PlayStation,Xbox,Gift Card")
 
-    run = st.button("Run comparative analysis")
+    st.subheader("Performance")
+    concurrency = st.slider("Concurrent eBay lookups", min_value=1, max_value=8, value=max(1, min(8, EBAY_CONCURRENCY)), step=1)
+    bypass_cache = st.checkbox("Bypass eBay response cache", value=False)
+    enrich_all = st.checkbox("Fetch all eBay signals (skip pruning of items that fail filters)", value=False)
+    incremental = st.checkbox("Incremental rescan (reuse recent eBay data from the price history)",
+                              value=False, disabled=not HISTORY_ENABLED)
+    fresh_hours = st.slider("Reuse eBay data younger than (hours)", min_value=1, max_value=48,
+                            value=max(1, int(HISTORY_FRESH_FOR // 3600)), step=1, disabled=not incremental)
+    block_resources = st.checkbox("Block images/fonts/CSS/third-party scripts in Amazon browser", value=AMAZON_BLOCK_RESOURCES)
+    cache = response_cache()
+    if cache:  # hits/misses are counted in the worker process; each scan shows its own
+        st.caption(f"Cache: {cache.stats()['entries']} pages")
+
+    run = st.button("Queue comparative analysis")
 
+queue = job_queue()
+params = dict(
+    min_profit=min_profit,
+    min_margin=min_margin/100.0,
+    min_sold_recent=min_sold,
+    ebay_fee_rate=ebay_fee_rate,
+    ebay_fixed_fee=ebay_fixed_fee,
+    max_items=max_items,
+    max_ebay_results=max_ebay_results,
+    avoid_keywords=[s.strip() for s in avoid.split(",") if s.strip()],
+    query_words=query_words,
+    match_threshold=match_threshold,
+    concurrency=concurrency,
+    use_cache=not bypass_cache,
+    enrich_all=enrich_all,
+    incremental=incremental,
+    fresh_for=fresh_hours * 3600,
+    block_resources=block_resources,
+)
+if autod:
+    params["discover"] = max_cats
+else:
+    params["categories"] = [ln.strip() for ln in cats_text.splitlines() if ln.strip()]
 if run:
-    if autod:
-        with st.spinner("Discovering Amazon Best Seller categories..."):
-            categories = discover_best_seller_categories(max_categories=max_cats)
+    if not autod and not params["categories"]:
+        st.error("No categories to scan. Provide URLs or use auto-discover.")
     else:
-        categories = [ln.strip() for ln in cats_text.splitlines() if ln.strip()]
+        st.session_state["job_id"] = queue.submit(params)
 
-    if not categories:
-        st.error("No categories to scan. Provide URLs or use auto-discover.")
+workers = queue.workers()
+if not workers:
+    st.warning("No scan worker is running, so queued scans will wait. Start one with `python scan_worker.py`.")
+for w in workers:
+    b = w["info"].get("browser") or {}
+    if b.get("status") in ("failed", "crashed", "restarting"):
+        st.warning(f"Worker {w['worker_id']}: Amazon browser {b['status']}"
+                   + (f" ({b['last_error']})" if b.get("last_error") else ""))
+with st.sidebar.expander("Workers"):
+    for w in workers:
+        b = w["info"].get("browser") or {}
+        st.caption(f"**{w['worker_id']}** · {'scan #' + str(w['job_id']) if w['job_id'] else 'idle'} · "
+                   f"browser {b.get('status', '?')}"
+                   + (f", warm in {b['warm_s']}s" if b.get("warm_s") is not None else "")
+                   + f" · {b.get('idle_pages', 0)}/{b.get('pages', 0)} tabs free · {b.get('fetches', 0)} pages"
+                   + f" · {b.get('restarts', 0)} restarts, {b.get('relogins', 0)} re-logins")
+
+recent = queue.jobs(limit=20)
+if recent:
+    labels = {j.job_id: f"#{j.job_id} · {j.status} · {datetime.fromtimestamp(j.submitted_at):%d %b %H:%M} · "
+                        f"{j.rows_found} found" for j in recent}
+    current = st.session_state.get("job_id")
+    job_id = st.selectbox("Scan", list(labels), format_func=labels.get,
+                          index=list(labels).index(current) if current in labels else 0)
+    st.session_state["job_id"] = job_id
+    job = queue.get(job_id)
+    if job.active:
+        render_live_job(job_id, queue)
     else:
-        with st.spinner("Scanning categories, checking eBay demand/price, estimating profit..."):
-            results = find_opportunities(
-                categories=categories,
-                min_profit=min_profit,
-                min_margin=min_margin/100.0,
-                min_sold_recent=min_sold,
-                ebay_fee_rate=ebay_fee_rate,
-                ebay_fixed_fee=ebay_fixed_fee,
-                max_items=max_items,
-                max_ebay_results=max_ebay_results,
-                avoid_keywords=[s.strip() for s in avoid.split(",") if s.strip()],
-                query_words=query_words
-            )
-        if not results:
-            st.info("No items matched your filters. Lower the thresholds or try different categories.")
-        else:
-            df = pd.DataFrame([r.__dict__ for r in results])
-            df["est_margin_pct"] = (df["est_margin"] * 100).round(2)
-            cols = ["title","amazon_price","ebay_price","ebay_shipping","ebay_total_price","estimated_ebay_fee",
-                    "est_profit_gbp","est_margin_pct","sold_recent","prime","rating","reviews",
-                    "amazon_url","ebay_url","asin","category_url","image_url"]
-            df = df[cols]
-            st.success(f"Found {len(df)} comparative opportunities across {len(categories)} categories")
-            st.dataframe(df, use_container_width=True, height=500)
-
-            csv = df.to_csv(index=False)
-            ts = datetime.now().strftime("%Y%m%d_%H%M")
-            st.download_button("Download CSV report", data=csv, file_name=f"comparative_report_{ts}.csv", mime="text/csv")
+        render_job(job, queue, params)
 else:
-    st.info("Choose auto-discover or paste URLs, set filters, then click **Run comparative analysis**.")
+    st.info("Choose auto-discover or paste URLs, set filters, then click **Queue comparative analysis**.")
@@ -1,6 +1,7 @@
 """
 arbitrage_core.py (v5.3 — Amazon login with Playwright **Firefox**)
 - Always logs in to Amazon (headless Playwright Firefox) and fetches Best Seller pages while authenticated.
+  Pages load in parallel across a pool of tabs; cookies are saved to AMAZON_STATE_PATH and reused.
 - eBay is scraped with plain requests (no login).
 - Use this for comparative analysis only (no posting/automation).
 
@@ -8,17 +9,33 @@ Env (required):
   AMAZON_EMAIL, AMAZON_PASSWORD
   AMAZON_TOTP_SECRET  (optional, for authenticator-app 2FA)
 
+Env (optional):
+  PLAYWRIGHT_PAGES (default 3), AMAZON_STATE_PATH, AMAZON_STATE_MAX_AGE (seconds)
+
 Render env (recommended):
   PLAYWRIGHT_BROWSERS_PATH=/opt/render/.cache/ms-playwright
   PLAYWRIGHT_SKIP_VALIDATE_HOST_REQUIREMENTS=1
 """
 
-import os, random, re, time, urllib.parse
-from typing import List, Optional, Set
-from dataclasses import dataclass
+import asyncio, email.utils, functools, json, multiprocessing, os, random, re, sqlite3, threading, time, urllib.parse
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+from collections import deque
+from dataclasses import asdict, dataclass, field, fields
 
+import numpy as np
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from bs4 import BeautifulSoup, SoupStrainer
+
+try:
+    import brotli  # noqa: F401  (lets urllib3 decode "br" responses)
+    _ACCEPT_ENCODING = "gzip, deflate, br"
+except ImportError:
+    _ACCEPT_ENCODING = "gzip, deflate"
 
 # ------------------ Constants ------------------
 AMAZON_BASE = "https://www.amazon.co.uk"
@@ -32,134 +49,1092 @@ HEADERS_POOL = [
     "Mozilla/5.0 (X11; Linux x86_64; rv:124.0) Gecko/20100101 Firefox/124.0",
 ]
 
-DELAY_MIN = float(os.environ.get("SCRAPER_DELAY_MIN", 1.0))
-DELAY_MAX = float(os.environ.get("SCRAPER_DELAY_MAX", 2.2))
 MAX_RETRIES = int(os.environ.get("SCRAPER_MAX_RETRIES", 6))
-BACKOFF_BASE = float(os.environ.get("SCRAPER_BACKOFF_BASE", 2.0))
+BACKOFF_BASE = float(os.environ.get("SCRAPER_BACKOFF_BASE", 2.0))  # first throttle pause without Retry-After (s)
+THROTTLE_STATUSES = (429, 503, 502, 520, 522, 524)  # the host pushing back (403 too, until the last attempt)
+
+# Adaptive per-host politeness (requests/second per host, shared by all fetchers)
+def _legacy_delay_rate() -> Optional[float]:
+    """Starting rate from the old fixed pause, SCRAPER_DELAY_MIN/MAX seconds: one request per mean delay."""
+    if not {"SCRAPER_DELAY_MIN", "SCRAPER_DELAY_MAX"} & set(os.environ):
+        return None
+    delay = (float(os.environ.get("SCRAPER_DELAY_MIN", 1.0)) + float(os.environ.get("SCRAPER_DELAY_MAX", 2.2))) / 2
+    return 1 / delay if delay > 0 else float("inf")  # the limiter clamps to RATE_MAX
+
+RATE_INITIAL = float(os.environ.get("SCRAPER_RATE_INITIAL", _legacy_delay_rate() or 0.6))
+RATE_MIN = float(os.environ.get("SCRAPER_RATE_MIN", 0.1))
+RATE_MAX = float(os.environ.get("SCRAPER_RATE_MAX", 3.0))
+RATE_INCREASE = float(os.environ.get("SCRAPER_RATE_INCREASE", 0.05))  # additive, per clean response
+RATE_DECREASE = float(os.environ.get("SCRAPER_RATE_DECREASE", 0.5))   # multiplicative, per throttle
+RATE_BURST = float(os.environ.get("SCRAPER_RATE_BURST", 1.0))
+RATE_JITTER = float(os.environ.get("SCRAPER_RATE_JITTER", 0.3))  # extra random wait, fraction of one interval
+RATE_MAX_PAUSE = float(os.environ.get("SCRAPER_RATE_MAX_PAUSE", 120.0))
+EBAY_CONCURRENCY = int(os.environ.get("SCRAPER_CONCURRENCY", 1))  # eBay lookups in flight (1 = serial)
+HOST_CONCURRENCY = int(os.environ.get("SCRAPER_HOST_CONCURRENCY", 2))  # max concurrent requests per host
+POOL_MAXSIZE = int(os.environ.get("SCRAPER_POOL_MAXSIZE", max(HOST_CONCURRENCY, 2)))  # keep-alive conns per host
+HOST_POOL_SIZES = {  # per-host overrides, e.g. "www.ebay.co.uk=4,example.com=1"
+    h.strip(): int(n) for h, _, n in (item.partition("=") for item in os.environ.get("SCRAPER_HOST_POOL_SIZES", "").split(","))
+    if h.strip() and n.strip().isdigit()
+}
+HOST_RATES = {  # per-host starting rates, e.g. "www.ebay.co.uk=1.0"
+    h.strip(): float(r) for h, _, r in (item.partition("=") for item in os.environ.get("SCRAPER_HOST_RATES", "").split(","))
+    if h.strip() and r.strip().replace(".", "", 1).isdigit()
+}
+UA_ROTATE_EVERY = int(os.environ.get("SCRAPER_UA_ROTATE_EVERY", 25))  # requests per User-Agent
+
+HTML_PARSER = os.environ.get("SCRAPER_HTML_PARSER", "auto")  # auto | lxml | html.parser
+HTML_PARSE_ONLY = os.environ.get("SCRAPER_PARSE_ONLY", "1") != "0"  # build only the nodes we read
+def _usable_cpus() -> int:
+    """CPUs this process may actually use: its affinity mask, further limited by a cgroup v2 CPU quota."""
+    try:
+        n = len(os.sched_getaffinity(0))
+    except (AttributeError, OSError):  # not on Linux
+        n = os.cpu_count() or 1
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()[:2]
+        if quota != "max":
+            n = min(n, max(1, int(int(quota) // int(period))))
+    except (OSError, ValueError):
+        pass
+    return n
+
+_parse_workers = os.environ.get("SCRAPER_PARSE_WORKERS", "auto")  # parse processes; 0 = parse in the fetching thread
+PARSE_WORKERS = min(4, _usable_cpus() - 1) if _parse_workers == "auto" else int(_parse_workers)
+PARSE_QUEUE_DEPTH = int(os.environ.get("SCRAPER_PARSE_QUEUE_DEPTH", 2 * max(1, PARSE_WORKERS)))  # pages in flight
+
+MATCH_THRESHOLD = float(os.environ.get("SCRAPER_MATCH_THRESHOLD", 0.0))  # min eBay/Amazon title similarity (0 = off)
+MATCH_REF_WORDS = int(os.environ.get("SCRAPER_MATCH_REF_WORDS", 12))  # Amazon title words compared (eBay titles are <= 80 chars)
+MATCH_SCAN_RESULTS = int(os.environ.get("SCRAPER_MATCH_SCAN_RESULTS", 60))  # listings scored per eBay page
+MATCH_MISSING_PENALTY = float(os.environ.get("SCRAPER_MATCH_MISSING_PENALTY", 0.5))  # brand/model number absent
+
+CACHE_ENABLED = os.environ.get("SCRAPER_CACHE", "1") != "0"
+CACHE_PATH = os.environ.get("SCRAPER_CACHE_PATH", ".scraper_cache.sqlite3")
+CACHE_TTL_PRICE = float(os.environ.get("SCRAPER_CACHE_TTL_PRICE", 3600))   # eBay "best price" search pages
+CACHE_TTL_SOLD = float(os.environ.get("SCRAPER_CACHE_TTL_SOLD", 6 * 3600))  # eBay sold/completed pages
+CACHE_MAX_ENTRIES = int(os.environ.get("SCRAPER_CACHE_MAX_ENTRIES", 5000))
+
+HISTORY_ENABLED = os.environ.get("SCRAPER_HISTORY", "1") != "0"
+HISTORY_PATH = os.environ.get("SCRAPER_HISTORY_PATH", ".price_history.sqlite3")
+HISTORY_FRESH_FOR = float(os.environ.get("SCRAPER_HISTORY_FRESH_FOR", 6 * 3600))  # incremental: reuse eBay signals this young
+HISTORY_PRICE_TOLERANCE = float(os.environ.get("SCRAPER_HISTORY_PRICE_TOLERANCE", 0.02))  # Amazon price move forcing a refresh
+HISTORY_MIN_MOVE = float(os.environ.get("SCRAPER_HISTORY_MIN_MOVE", 0.50))  # GBP profit change reported as "moved"
 
 AMAZON_EMAIL = os.environ.get("AMAZON_EMAIL")
 AMAZON_PASSWORD = os.environ.get("AMAZON_PASSWORD")
 AMAZON_TOTP_SECRET = os.environ.get("AMAZON_TOTP_SECRET")  # optional (for authenticator 2FA)
 
-def sleep_polite(a: float = DELAY_MIN, b: float = DELAY_MAX):
-    time.sleep(random.uniform(a, b))
-
 class FetchError(Exception):
     pass
 
+_host_slots: Dict[str, threading.BoundedSemaphore] = {}
+_host_slots_lock = threading.Lock()
+
+def _host_slot(url: str) -> threading.BoundedSemaphore:
+    """Per-host semaphore capping concurrent requests at HOST_CONCURRENCY."""
+    host = urllib.parse.urlparse(url).netloc
+    with _host_slots_lock:
+        sem = _host_slots.get(host)
+        if sem is None:
+            sem = _host_slots[host] = threading.BoundedSemaphore(max(1, HOST_CONCURRENCY))
+    return sem
+
+# ---------------- Adaptive per-host rate limiting ----------------
+class HostRateLimiter:
+    """
+    Token bucket for one host whose rate adapts AIMD-style: +increase req/s per clean response
+    (up to max_rate), x decrease on throttling (down to min_rate). A throttle also pauses the
+    host for Retry-After, or an exponentially growing, jittered backoff when no header is sent.
+    reserve() is lock-protected and never sleeps, so threads (acquire) and asyncio
+    (acquire_async) can share one limiter.
+    """
+
+    def __init__(self, rate: float = RATE_INITIAL, min_rate: float = RATE_MIN, max_rate: float = RATE_MAX,
+                 increase: float = RATE_INCREASE, decrease: float = RATE_DECREASE, burst: float = RATE_BURST):
+        self.min_rate, self.max_rate = min_rate, max_rate
+        self.rate = min(max(rate, min_rate), max_rate)
+        self.increase, self.decrease, self.burst = increase, decrease, max(1.0, burst)
+        self.throttles = 0
+        self._strikes = 0  # consecutive throttles, drives the backoff exponent
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Claim the next send slot; returns how long the caller must wait before sending."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1  # below zero = queued behind earlier reservations
+            wait = max(-self._tokens / self.rate, self._paused_until - now, 0.0)
+            # a little jitter so concurrent fetchers don't fire in lock-step
+            return wait + random.uniform(0, RATE_JITTER / self.rate) if wait else wait
+
+    def acquire(self) -> float:
+        wait = self.reserve()
+        if wait:
+            time.sleep(wait)
+        return wait
+
+    async def acquire_async(self) -> float:
+        wait = self.reserve()
+        if wait:
+            await asyncio.sleep(wait)
+        return wait
+
+    def on_success(self):
+        with self._lock:
+            self._strikes = 0
+            self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def on_throttle(self, retry_after: Optional[float] = None) -> float:
+        """Multiplicative decrease plus a pause; returns the pause length in seconds."""
+        with self._lock:
+            self.throttles += 1
+            self._strikes += 1
+            self.rate = max(self.min_rate, self.rate * self.decrease)
+            if retry_after is not None:
+                pause = retry_after
+            else:
+                pause = min(RATE_MAX_PAUSE, BACKOFF_BASE * 2 ** (self._strikes - 1)) * random.uniform(0.5, 1.5)
+            now = time.monotonic()
+            self._paused_until = max(self._paused_until, now + pause)
+            self._tokens = min(self._tokens, 0.0)
+            return pause
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"rate": round(self.rate, 3), "throttles": self.throttles,
+                    "paused_for_s": round(max(0.0, self._paused_until - time.monotonic()), 2)}
+
+_host_limiters: Dict[str, HostRateLimiter] = {}
+_host_limiters_lock = threading.Lock()
+
+def host_limiter(url: str) -> HostRateLimiter:
+    host = urllib.parse.urlparse(url).netloc
+    with _host_limiters_lock:
+        lim = _host_limiters.get(host)
+        if lim is None:
+            lim = _host_limiters[host] = HostRateLimiter(rate=HOST_RATES.get(host, RATE_INITIAL))
+    return lim
+
+def rate_limiter_snapshot() -> Dict[str, dict]:
+    """Current adaptive rate (req/s), throttle count and remaining pause per host."""
+    with _host_limiters_lock:
+        items = list(_host_limiters.items())
+    return {host: lim.snapshot() for host, lim in items}
+
+def _retry_after_seconds(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header (delta-seconds or HTTP date)."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+# ---------------- Metrics ----------------
+class ScanMetrics:
+    """
+    Thread-safe per-scan instrumentation: wall-time samples per (stage, host) and labelled counters
+    (requests by status, retries, bytes, cache hits, items...). Exported as JSON or Prometheus text.
+    """
+    MAX_SAMPLES = 10_000  # per (stage, host); beyond that only totals are updated
+
+    def __init__(self):
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self._timers: Dict[Tuple[str, str], list] = {}  # -> [calls, seconds, max, samples]
+        self._counters: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+        self._frozen_stages: Optional[List[dict]] = None  # set by from_dict (per-sample data isn't exported)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "ScanMetrics":
+        """Rebuild exported metrics (e.g. a finished job's) for display and re-export; stages are read-only."""
+        m = cls()
+        m.started = time.time() - data.get("elapsed_s", 0.0)
+        m._frozen_stages = [dict(s) for s in data.get("stages", [])]
+        for c in data.get("counters", []):
+            m.inc(c["name"], c["value"], **c["labels"])
+        return m
+
+    def observe(self, stage: str, seconds: float, host: str = ""):
+        with self._lock:
+            t = self._timers.setdefault((stage, host), [0, 0.0, 0.0, []])
+            t[0] += 1
+            t[1] += seconds
+            t[2] = max(t[2], seconds)
+            if len(t[3]) < self.MAX_SAMPLES:
+                t[3].append(seconds)
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    @staticmethod
+    def _pct(samples: List[float], q: float) -> float:
+        if not samples:
+            return 0.0
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+    def stages(self) -> List[dict]:
+        if self._frozen_stages is not None:
+            return [dict(s) for s in self._frozen_stages]
+        with self._lock:
+            items = [(k, list(v[:3]), list(v[3])) for k, v in self._timers.items()]
+        return [{"stage": stage, "host": host, "calls": calls, "seconds": round(total, 4), "max_s": round(mx, 4),
+                 "p50_s": round(self._pct(samples, 0.5), 4), "p95_s": round(self._pct(samples, 0.95), 4)}
+                for (stage, host), (calls, total, mx), samples in sorted(items)]
+
+    def stage_totals(self) -> Dict[str, float]:
+        """Seconds per stage summed over hosts."""
+        out: Dict[str, float] = {}
+        for s in self.stages():
+            out[s["stage"]] = round(out.get(s["stage"], 0.0) + s["seconds"], 4)
+        return out
+
+    def counters(self) -> List[dict]:
+        with self._lock:
+            items = sorted(self._counters.items())
+        return [{"name": name, "labels": dict(labels), "value": value} for (name, labels), value in items]
+
+    def counter(self, name: str, **labels) -> float:
+        """Sum of a counter over every label set that includes the given labels."""
+        want = {k: str(v) for k, v in labels.items()}
+        return sum(c["value"] for c in self.counters()
+                   if c["name"] == name and all(c["labels"].get(k) == v for k, v in want.items()))
+
+    def to_dict(self) -> dict:
+        return {"elapsed_s": round(time.time() - self.started, 3), "stages": self.stages(), "counters": self.counters()}
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), indent=2)
+
+    def to_prometheus(self, prefix: str = "scraper") -> str:
+        def fmt(labels: Dict[str, str]) -> str:
+            if not labels:
+                return ""
+            esc = lambda v: str(v).replace("\\", "\\\\").replace('"', '\\"')
+            return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in sorted(labels.items())) + "}"
+
+        lines = [f"# TYPE {prefix}_stage_seconds_total counter",
+                 f"# TYPE {prefix}_stage_calls_total counter",
+                 f"# TYPE {prefix}_stage_seconds_max gauge"]
+        for s in self.stages():
+            labels = fmt({"stage": s["stage"], "host": s["host"]})
+            lines += [f"{prefix}_stage_seconds_total{labels} {s['seconds']}",
+                      f"{prefix}_stage_calls_total{labels} {s['calls']}",
+                      f"{prefix}_stage_seconds_max{labels} {s['max_s']}"]
+        typed: Set[str] = set()
+        for c in self.counters():
+            name = f"{prefix}_{c['name']}_total"
+            if name not in typed:
+                lines.append(f"# TYPE {name} counter")
+                typed.add(name)
+            lines.append(f"{name}{fmt(c['labels'])} {c['value']:g}")
+        return "\n".join(lines) + "\n"
+
+_metrics_var: ContextVar[Optional[ScanMetrics]] = ContextVar("scan_metrics", default=None)
+
+@contextmanager
+def _stage(stage: str, host: str = ""):
+    """Time the block into the active scan's metrics (no-op outside a scan)."""
+    m = _metrics_var.get()
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        if m is not None:
+            m.observe(stage, time.perf_counter() - t0, host)
+
+def _count(name: str, value: float = 1, **labels):
+    m = _metrics_var.get()
+    if m is not None:
+        m.inc(name, value, **labels)
+
+def _timed(stage: str):
+    """Decorator form of _stage."""
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with _stage(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return deco
+
+def _with_metrics(fn, metrics: Optional[ScanMetrics]):
+    """Wrap fn so it records into `metrics` on whichever thread runs it (pool threads don't inherit context)."""
+    def run(*args, **kwargs):
+        token = _metrics_var.set(metrics)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _metrics_var.reset(token)
+    return run
+
+def _host(url: str) -> str:
+    return urllib.parse.urlparse(url).netloc
+
 # ---------------- Requests (for eBay/public) ----------------
+_BASE_HEADERS = {
+    "Accept-Language": "en-GB,en;q=0.9",
+    "Accept-Encoding": _ACCEPT_ENCODING,
+    "Cache-Control": "no-cache",
+    "Pragma": "no-cache",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Upgrade-Insecure-Requests": "1",
+    "DNT": "1",
+    "Connection": "keep-alive",
+}
+
+_session: Optional[requests.Session] = None
+_session_hosts: Set[str] = set()
+_session_lock = threading.Lock()
+_ua_state = {"ua": None, "uses": 0}
+
+def _http_session(url: str) -> requests.Session:
+    """Shared keep-alive session; each host gets its own adapter sized by HOST_POOL_SIZES/POOL_MAXSIZE."""
+    global _session
+    parts = urllib.parse.urlparse(url)
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            _session.headers.update(_BASE_HEADERS)
+        if parts.netloc not in _session_hosts:
+            size = HOST_POOL_SIZES.get(parts.netloc, POOL_MAXSIZE)
+            _session.mount(f"{parts.scheme}://{parts.netloc}/", HTTPAdapter(pool_connections=1, pool_maxsize=size))
+            _session_hosts.add(parts.netloc)
+    return _session
+
+def _user_agent() -> str:
+    """Rotate the UA every UA_ROTATE_EVERY requests; it is a per-request header, so pooled connections survive."""
+    with _session_lock:
+        if _ua_state["ua"] is None or _ua_state["uses"] >= UA_ROTATE_EVERY:
+            _ua_state["ua"] = random.choice(HEADERS_POOL)
+            _ua_state["uses"] = 0
+        _ua_state["uses"] += 1
+        return _ua_state["ua"]
+
 def _requests_get(url: str) -> requests.Response:
+    """
+    GET paced by the host's adaptive rate limiter. Throttling (THROTTLE_STATUSES, 403) slows the
+    whole host down and is retried; other 5xx and connection errors are retried at the current
+    rate; any other 4xx fails at once.
+    """
     last_exc = None
+    session = _http_session(url)
+    host = _host(url)
+    limiter = host_limiter(url)
     for attempt in range(1, MAX_RETRIES + 1):
-        headers = {
-            "User-Agent": random.choice(HEADERS_POOL),
-            "Accept-Language": "en-GB,en;q=0.9",
-            "Cache-Control": "no-cache",
-            "Pragma": "no-cache",
-            "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
-            "Upgrade-Insecure-Requests": "1",
-            "DNT": "1",
-        }
+        with _stage("sleep", host):
+            limiter.acquire()
+        headers = {"User-Agent": _user_agent()}
         try:
-            resp = requests.get(url, headers=headers, timeout=30)
-            if resp.status_code in (429, 503, 502, 520, 522, 524):
-                time.sleep(BACKOFF_BASE * attempt);  continue
-            if resp.status_code == 403:
-                time.sleep(BACKOFF_BASE * attempt)
-                if attempt < MAX_RETRIES:
-                    continue
-            resp.raise_for_status()
-            return resp
-        except requests.RequestException as e:
+            with _stage("http", host):
+                resp = session.get(url, headers=headers, timeout=30)
+            _count("requests", host=host, status=resp.status_code)
+            _count("bytes", len(resp.content), host=host)
+        except requests.RequestException as e:  # connection error or timeout: not the host throttling us
             last_exc = e
-            time.sleep(BACKOFF_BASE * attempt)
+            _count("requests", host=host, status="error")
+            _count("retries", host=host, status="error")
+            continue
+        if resp.status_code in THROTTLE_STATUSES or (resp.status_code == 403 and attempt < MAX_RETRIES):
+            last_exc = f"HTTP {resp.status_code}"
+            _count("retries", host=host, status=resp.status_code)
+            limiter.on_throttle(_retry_after_seconds(resp.headers.get("Retry-After")))
+            continue
+        if resp.status_code >= 500:
+            last_exc = f"HTTP {resp.status_code}"
+            _count("retries", host=host, status=resp.status_code)
+            continue
+        if resp.status_code >= 400:
+            raise FetchError(f"Requests failed: {url} :: HTTP {resp.status_code}")
+        limiter.on_success()
+        return resp
     raise FetchError(f"Requests failed: {url} :: {last_exc}")
 
+def _polite_get(url: str) -> requests.Response:
+    """Rate-limited request, held under the per-host concurrency cap."""
+    with _host_slot(url):
+        return _requests_get(url)
+
+# ---------------- Response cache (SQLite, TTL + LRU) ----------------
+class ResponseCache:
+    """On-disk page cache keyed by normalized URL, with per-kind TTLs and LRU eviction past max_entries."""
+
+    def __init__(self, path: str = CACHE_PATH, max_entries: int = CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.hits: Dict[str, int] = {}
+        self.misses: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, kind TEXT NOT NULL, body TEXT NOT NULL,"
+            " fetched_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_lru ON responses (accessed_at)")
+        self._conn.commit()
+
+    @staticmethod
+    def normalize(url: str) -> str:
+        """Lower-case scheme/host, drop the fragment and sort query params so equivalent URLs share a key."""
+        parts = urllib.parse.urlsplit(url)
+        query = urllib.parse.urlencode(sorted(urllib.parse.parse_qsl(parts.query, keep_blank_values=True)))
+        return urllib.parse.urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path or "/", query, ""))
+
+    def get(self, url: str, kind: str, ttl: float) -> Optional[str]:
+        key, now = self.normalize(url), time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT body FROM responses WHERE key = ? AND kind = ? AND fetched_at >= ?", (key, kind, now - ttl)
+            ).fetchone()
+            counter = self.hits if row else self.misses
+            counter[kind] = counter.get(kind, 0) + 1
+            _count("cache_hits" if row else "cache_misses", kind=kind)
+            if row:
+                self._conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+                self._conn.commit()
+        return row[0] if row else None
+
+    def put(self, url: str, kind: str, body: str):
+        key, now = self.normalize(url), time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, kind, body, fetched_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, kind, body, now, now),
+            )
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()
+            if count > self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY accessed_at LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            (entries,) = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()
+            return {"entries": entries, "hits": dict(self.hits), "misses": dict(self.misses)}
+
+_cache: Optional[ResponseCache] = None
+_cache_lock = threading.Lock()
+
+def response_cache() -> Optional[ResponseCache]:
+    """Process-wide cache, or None when disabled (SCRAPER_CACHE=0) or the cache file can't be opened."""
+    global _cache, CACHE_ENABLED
+    if not CACHE_ENABLED:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            try:
+                _cache = ResponseCache()
+            except sqlite3.Error:
+                CACHE_ENABLED = False
+                return None
+    return _cache
+
+class SingleFlight:
+    """
+    Run-scoped call coalescing: calls with the same key share one execution while it is in
+    flight. Finished calls are forgotten unless do() is told to remember the result (keep those
+    small: parsed results, not pages). `shared` counts the calls that were saved.
+    """
+
+    def __init__(self):
+        self.shared = 0
+        self._lock = threading.Lock()
+        self._calls: Dict[object, Future] = {}
+        self._done: Dict[object, object] = {}
+
+    def do(self, key, fn, *args, remember: bool = False):
+        with self._lock:
+            if key in self._done:
+                self.shared += 1
+                _count("coalesced_fetches")
+                return self._done[key]
+            fut = self._calls.get(key)
+            owner = fut is None
+            if owner:
+                fut = self._calls[key] = Future()
+            else:
+                self.shared += 1
+                _count("coalesced_fetches")
+        if owner:
+            try:
+                result = fn(*args)
+            except BaseException as e:
+                with self._lock:
+                    del self._calls[key]
+                fut.set_exception(e)
+            else:
+                with self._lock:
+                    if remember:
+                        self._done[key] = result
+                    del self._calls[key]
+                fut.set_result(result)
+        return fut.result()
+
+def _cached_polite_get(url: str, kind: str, ttl: float, use_cache: bool = True,
+                       flight: Optional[SingleFlight] = None) -> str:
+    """
+    Page text from the response cache if fresh, else a polite fetch. use_cache=False skips the
+    read, still refreshes. With a `flight`, identical URLs fetched at the same time share one fetch.
+    """
+    if flight is not None:
+        return flight.do(ResponseCache.normalize(url), _cached_polite_get, url, kind, ttl, use_cache)
+    cache = response_cache()
+    if cache and use_cache:
+        body = cache.get(url, kind, ttl)
+        if body is not None:
+            return body
+    text = _polite_get(url).text
+    if cache:
+        cache.put(url, kind, text)
+    return text
+
+def _fetch_parsed(url: str, kind: str, ttl: float, use_cache: bool, flight: Optional[SingleFlight], stage: str,
+                  fn, *args):
+    """
+    fn(page, *args) for a page fetched by _cached_polite_get. With a `flight`, identical
+    (url, args) within the run are fetched and parsed once; when the response cache can't answer
+    repeats, the parsed result (never the page) is kept for the rest of the run.
+    """
+    def run():
+        return _parse(stage, fn, _cached_polite_get(url, kind, ttl, use_cache, flight), *args)
+    if flight is None:
+        return run()
+    key = (kind, ResponseCache.normalize(url)) + args
+    return flight.do(key, run, remember=not (use_cache and response_cache()))
+
 # ---------------- Playwright (Firefox) + mandatory Amazon login ----------------
-_play_p = None
-_play_browser = None
-_play_ctx = None
-_play_page = None
-_logged_in = False
-
-def _ensure_playwright():
-    """Start Playwright Firefox context with UK locale/timezone."""
-    global _play_p, _play_browser, _play_ctx, _play_page
-    if _play_ctx and _play_page:
-        return _play_ctx, _play_page
-
-    from playwright.sync_api import sync_playwright
-    ua = random.choice(HEADERS_POOL)
-    width = random.choice([1280, 1366, 1440, 1600])
-    height = random.choice([720, 800, 900, 1080])
-
-    _play_p = sync_playwright().start()
-    # ---- FIREFOX here (not Chromium) ----
-    _play_browser = _play_p.firefox.launch(
-        headless=True,
-        args=[
-            "--disable-dev-shm-usage",
-            "--no-sandbox",
-        ],
-    )
-    _play_ctx = _play_browser.new_context(
-        user_agent=ua,
-        locale="en-GB",
-        timezone_id="Europe/London",
-        viewport={"width": width, "height": height},
-    )
-    _play_page = _play_ctx.new_page()
+PLAYWRIGHT_PAGES = int(os.environ.get("PLAYWRIGHT_PAGES", 3))  # tabs sharing the logged-in context
+AMAZON_STATE_PATH = os.environ.get("AMAZON_STATE_PATH", ".amazon_state.json")  # persisted cookies/storage
+AMAZON_STATE_MAX_AGE = float(os.environ.get("AMAZON_STATE_MAX_AGE", 24 * 3600))
 
-    try:
-        from playwright_stealth import stealth_sync
-        stealth_sync(_play_page)
-    except Exception:
-        pass
+def _env_set(name: str, default: str = "") -> Set[str]:
+    return {v.strip().lower() for v in os.environ.get(name, default).split(",") if v.strip()}
 
-    _play_page.set_extra_http_headers({"Accept-Language": "en-GB,en;q=0.9"})
-    return _play_ctx, _play_page
+# Opt-in request interception for Best Seller fetches (we only parse the HTML)
+AMAZON_BLOCK_RESOURCES = os.environ.get("AMAZON_BLOCK_RESOURCES", "0") == "1"
+AMAZON_BLOCK_TYPES = _env_set("AMAZON_BLOCK_TYPES", "image,media,font,stylesheet")
+AMAZON_BLOCK_DOMAINS = _env_set("AMAZON_BLOCK_DOMAINS")  # always blocked (suffix match)
+AMAZON_ALLOW_DOMAINS = _env_set("AMAZON_ALLOW_DOMAINS", "amazon.co.uk,amazon.com,media-amazon.com,ssl-images-amazon.com")
 
-def _amazon_login():
-    """Headless login to Amazon. Requires AMAZON_EMAIL/PASSWORD; supports TOTP 2FA if provided."""
-    global _logged_in
-    if _logged_in:
-        return
-    if not (AMAZON_EMAIL and AMAZON_PASSWORD):
-        raise FetchError("AMAZON_EMAIL and AMAZON_PASSWORD must be set for mandatory Amazon login.")
+# Rough transfer sizes used to estimate savings until real responses of that type have been seen
+_RESOURCE_SIZE_GUESS = {"image": 25_000, "media": 250_000, "font": 40_000, "stylesheet": 30_000, "script": 60_000}
 
-    ctx, page = _ensure_playwright()
-    page.goto("https://www.amazon.co.uk/ap/signin", wait_until="domcontentloaded", timeout=60000)
+def _domain_matches(host: str, domains: Set[str]) -> bool:
+    return any(host == d or host.endswith("." + d) for d in domains)
 
-    page.locator("input#ap_email").fill(AMAZON_EMAIL)
-    page.locator("input#continue").click()
-    page.wait_for_selector("input#ap_password", timeout=20000)
-    page.locator("input#ap_password").fill(AMAZON_PASSWORD)
-    page.locator("input#signInSubmit").click()
+@dataclass
+class ResourceBlockPolicy:
+    """Which subresources to abort: by Playwright resource type, deny-listed domain, or any domain outside allow_domains."""
+    types: Set[str] = field(default_factory=lambda: set(AMAZON_BLOCK_TYPES))
+    deny_domains: Set[str] = field(default_factory=lambda: set(AMAZON_BLOCK_DOMAINS))
+    allow_domains: Set[str] = field(default_factory=lambda: set(AMAZON_ALLOW_DOMAINS))  # empty = any domain
 
-    # If authenticator-based 2FA is enabled
-    try:
-        if page.locator("input#auth-mfa-otpcode").count():
-            if not AMAZON_TOTP_SECRET:
-                raise FetchError("Amazon requested OTP but AMAZON_TOTP_SECRET is not set (use authenticator-app TOTP).")
-            import pyotp
-            otp = pyotp.TOTP(AMAZON_TOTP_SECRET).now()
-            page.locator("input#auth-mfa-otpcode").fill(otp)
-            page.locator("input#auth-signin-button").click()
-            page.wait_for_load_state("domcontentloaded", timeout=25000)
-            page.wait_for_timeout(800)
-    except Exception:
-        # If no OTP field appears, continue
-        pass
+    def blocks(self, resource_type: str, url: str) -> bool:
+        if resource_type == "document":
+            return False
+        host = (urllib.parse.urlparse(url).hostname or "").lower()
+        if resource_type in self.types or _domain_matches(host, self.deny_domains):
+            return True
+        return bool(self.allow_domains) and not _domain_matches(host, self.allow_domains)
+
+@dataclass
+class PageFetchStats:
+    url: str
+    queue_ms: float = 0.0    # waiting for a free tab
+    login_ms: float = 0.0    # session check / login (first fetches only)
+    sleep_ms: float = 0.0    # politeness delay
+    load_ms: float = 0.0     # goto -> domcontentloaded
+    settle_ms: float = 0.0   # wait_for_timeout after load
+    content_ms: float = 0.0  # page.content()
+    bytes_loaded: int = 0
+    requests_blocked: int = 0
+    est_bytes_saved: int = 0
+
+class AmazonBrowser:
+    """
+    Headless Firefox with one authenticated context and a pool of N pages.
+    Playwright's async API runs on a private event-loop thread, so the sync methods are safe to
+    call from any thread; concurrent fetches are spread across the page pool, one fetch per page.
+    The context's storage state is saved after login and reused until it is stale or Amazon
+    redirects to sign-in, so a cold start only logs in when the session is really invalid.
+    warm_up() launches and logs in ahead of the first fetch. A crashed browser is relaunched (and
+    the fetches it broke retried once), a closed page is replaced, and health() reports the state.
+    """
+
+    def __init__(self, pages: int = PLAYWRIGHT_PAGES, state_path: str = AMAZON_STATE_PATH,
+                 block: Optional[ResourceBlockPolicy] = None):
+        self.pages = max(1, pages)
+        self.state_path = state_path
+        self.block = block if block is not None else (ResourceBlockPolicy() if AMAZON_BLOCK_RESOURCES else None)
+        self.fetch_stats: deque = deque(maxlen=500)  # PageFetchStats, most recent last
+        self._active: Dict[object, PageFetchStats] = {}  # page -> stats of the fetch it is serving
+        self._type_bytes: Dict[str, List[int]] = {}  # resource type -> [bytes, responses] actually loaded
+        self._sizing: Dict[Optional[int], Set[asyncio.Future]] = {}  # id(stats) -> response sizes still being read
+        self._route_installed = False
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="amazon-browser", daemon=True)
+        self._thread.start()
+        self._starting = None
+        self._p = self._browser = self._ctx = None
+        self._pool: Optional[asyncio.Queue] = None
+        self._login_lock: Optional[asyncio.Lock] = None
+        self._state_loaded = False
+        self._logged_in = False
+        self._pages: Set[object] = set()  # pages of the current browser (ones from a crashed one are dropped)
+        self._gen = 0  # bumped on every relaunch
+        self._restarting = None
+        self._closing = False
+        self._status = "cold"  # cold | starting | launched | logging_in | ready | crashed | restarting | failed | closed
+        self._last_error: Optional[str] = None
+        self._restarts = self._relogins = self._fetches = 0
+        self._ready_at: Optional[float] = None
+        self._warm_s: Optional[float] = None
+
+    def _call(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    def _state_fresh(self) -> bool:
+        try:
+            return time.time() - os.path.getmtime(self.state_path) < AMAZON_STATE_MAX_AGE
+        except OSError:
+            return False
+
+    async def _start(self):
+        # every caller runs on the loop thread, so a shared future is enough to start once
+        if self._starting is None:
+            self._starting = asyncio.ensure_future(self._launch())
+        await self._starting
+
+    async def _launch(self):
+        """Start Playwright Firefox context with UK locale/timezone and open the page pool."""
+        from playwright.async_api import async_playwright
+        self._status = "starting"
+        ua = random.choice(HEADERS_POOL)
+        width = random.choice([1280, 1366, 1440, 1600])
+        height = random.choice([720, 800, 900, 1080])
+
+        self._p = await async_playwright().start()
+        # ---- FIREFOX here (not Chromium) ----
+        self._browser = await self._p.firefox.launch(
+            headless=True,
+            args=[
+                "--disable-dev-shm-usage",
+                "--no-sandbox",
+            ],
+        )
+        self._state_loaded = self._state_fresh()
+        self._ctx = await self._browser.new_context(
+            user_agent=ua,
+            locale="en-GB",
+            timezone_id="Europe/London",
+            viewport={"width": width, "height": height},
+            storage_state=self.state_path if self._state_loaded else None,
+        )
+        await self._ctx.set_extra_http_headers({"Accept-Language": "en-GB,en;q=0.9"})
+        self._ctx.on("response", self._on_response)
+        self._browser.on("disconnected", self._on_disconnected)
+        if self.block:
+            await self._install_route()
+
+        if self._pool is None:
+            self._pool = asyncio.Queue()
+            self._login_lock = asyncio.Lock()
+        while not self._pool.empty():  # pages of a crashed browser; waiting fetches get the new ones
+            self._pool.get_nowait()
+        self._pages = set()
+        for _ in range(self.pages):
+            await self._new_page()
+        self._status = "launched"
+
+    async def _new_page(self):
+        page = await self._ctx.new_page()
+        try:
+            from playwright_stealth import stealth_async
+            await stealth_async(page)
+        except Exception:
+            pass
+        self._pages.add(page)
+        self._pool.put_nowait(page)
+
+    # ---- health, warm-up and recovery ----
+    def _on_disconnected(self, browser):
+        if self._closing or browser is not self._browser:
+            return
+        self._status = "crashed"
+        fut = asyncio.run_coroutine_threadsafe(self._restart(self._gen), self._loop)
+        fut.add_done_callback(lambda f: f.cancelled() or f.exception())  # failure is kept in health()
+
+    async def _restart(self, gen: int):
+        """Relaunch (and log in) once per crash, however many fetches noticed it."""
+        if self._restarting is None:
+            if gen != self._gen:
+                return  # already relaunched since this caller's browser died
+            self._restarting = asyncio.ensure_future(self._relaunch())
+        await asyncio.shield(self._restarting)
+
+    async def _relaunch(self):
+        try:
+            self._gen += 1
+            self._restarts += 1
+            self._status = "restarting"
+            self._logged_in = False
+            await self._shutdown()
+            await self._warm(login=True)
+        except Exception as e:
+            self._status, self._last_error = "failed", f"{type(e).__name__}: {e}"
+            await self._drop_failed_launch()
+            raise
+        finally:
+            self._restarting = None
+
+    async def _shutdown(self):
+        """Close whatever the last launch got running (context, browser, Playwright), even half-started."""
+        old = (self._ctx, self._browser, self._p)
+        self._ctx = self._browser = self._p = None
+        self._starting = None
+        self._route_installed = False
+        for closer in (old[0] and old[0].close, old[1] and old[1].close, old[2] and old[2].stop):
+            if closer:
+                try:
+                    await asyncio.wait_for(closer(), 10)
+                except Exception:
+                    pass
+
+    async def _drop_failed_launch(self):
+        """
+        After a failed warm-up, tear down a launch that didn't finish so the next fetch starts a
+        fresh one. A browser that launched but couldn't log in is kept: the next fetch retries the login.
+        """
+        starting = self._starting
+        if starting is not None and starting.done() and (starting.cancelled() or starting.exception() is not None):
+            await self._shutdown()
+
+    async def _warm(self, login: bool):
+        t0 = time.perf_counter()
+        await self._start()
+        if login:
+            page = await self._pool.get()
+            try:
+                await self._ensure_login(page)
+            finally:
+                self._give_back(page)
+        self._warm_s = round(time.perf_counter() - t0, 2)
+
+    def warm_up(self, login: bool = True) -> dict:
+        """Launch the browser (and log in) now instead of on the first fetch; returns health()."""
+        try:
+            self._call(self._warm(login))
+        except Exception as e:
+            self._status, self._last_error = "failed", f"{type(e).__name__}: {e}"
+            self._call(self._drop_failed_launch())
+        return self.health()
+
+    def health(self) -> dict:
+        """JSON-ready status: lifecycle state, connection, login, free pages, restarts and last error."""
+        browser = self._browser
+        return {
+            "status": self._status,
+            "connected": bool(browser is not None and browser.is_connected()),
+            "logged_in": self._logged_in,
+            "pages": len(self._pages),
+            "idle_pages": self._pool.qsize() if self._pool is not None else 0,
+            "fetches": self._fetches,
+            "restarts": self._restarts,
+            "relogins": self._relogins,
+            "warm_s": self._warm_s,
+            "ready_since": self._ready_at,
+            "last_error": self._last_error,
+        }
+
+    def close(self):
+        """Shut the browser down (no automatic restart)."""
+        self._closing = True
+        if self._starting is not None:
+            self._call(self._shutdown())
+        self._status = "closed"
+
+    def _give_back(self, page):
+        if page in self._pages:
+            self._pool.put_nowait(page)
+
+    def _broken(self, page) -> bool:
+        browser = self._browser
+        return not self._closing and (browser is None or not browser.is_connected() or page.is_closed())
+
+    # ---- resource blocking ----
+    async def _install_route(self):
+        if not self._route_installed:
+            await self._ctx.route("**/*", self._on_route)
+            self._route_installed = True
+
+    @staticmethod
+    def _page_of(obj):
+        try:
+            return obj.frame.page
+        except Exception:  # service-worker requests have no frame
+            return None
+
+    async def _on_route(self, route):
+        req = route.request
+        stats = self._active.get(self._page_of(req))
+        # only data fetches are filtered; login/session checks load the full page
+        if stats is not None and self.block and self.block.blocks(req.resource_type, req.url):
+            total, seen = self._type_bytes.get(req.resource_type, (0, 0))
+            stats.requests_blocked += 1
+            stats.est_bytes_saved += total // seen if seen else _RESOURCE_SIZE_GUESS.get(req.resource_type, 0)
+            await route.abort()
+        else:
+            await route.continue_()
+
+    def _on_response(self, response):
+        stats = self._active.get(self._page_of(response))
+        try:
+            size = int(response.headers["content-length"])
+        except (KeyError, ValueError):
+            # chunked and HTTP/2 responses often send no length: ask Playwright once the body is in
+            key = id(stats) if stats is not None else None
+            task = asyncio.ensure_future(self._measure(response, stats))
+            self._sizing.setdefault(key, set()).add(task)
+            task.add_done_callback(lambda t: self._sizing_done(key, t))
+            return
+        self._add_bytes(response.request.resource_type, size, stats)
+
+    async def _measure(self, response, stats: Optional[PageFetchStats]):
+        try:
+            sizes = await asyncio.wait_for(response.request.sizes(), 10)
+        except Exception:
+            return  # size unknown: left out of bytes_loaded and of the per-type average
+        self._add_bytes(response.request.resource_type, sizes.get("responseBodySize", 0), stats)
 
-    page.goto(AMAZON_BASE, wait_until="domcontentloaded", timeout=45000)
-    _logged_in = True
+    def _sizing_done(self, key: Optional[int], task):
+        pending = self._sizing.get(key)
+        if pending is not None:
+            pending.discard(task)
+            if not pending:
+                del self._sizing[key]
+
+    def _add_bytes(self, kind: str, size: int, stats: Optional[PageFetchStats]):
+        acc = self._type_bytes.setdefault(kind, [0, 0])
+        acc[0] += size
+        acc[1] += 1
+        if stats is not None:
+            stats.bytes_loaded += size
+
+    def set_resource_blocking(self, policy: Optional[ResourceBlockPolicy]):
+        """Enable (policy) or disable (None) request interception for subsequent fetches."""
+        self.block = policy
+        if policy and self._ctx is not None:
+            self._call(self._install_route())
+
+    def stats_summary(self, last: Optional[int] = None) -> dict:
+        """Aggregate of the last N page fetches (all kept ones by default)."""
+        items = list(self.fetch_stats)
+        if last is not None:
+            items = items[max(0, len(items) - last):]
+        n = len(items)
+        return {
+            "pages": n,
+            "avg_load_ms": round(sum(s.load_ms for s in items) / n, 1) if n else 0.0,
+            "bytes_loaded": sum(s.bytes_loaded for s in items),
+            "requests_blocked": sum(s.requests_blocked for s in items),
+            "est_bytes_saved": sum(s.est_bytes_saved for s in items),
+        }
+
+    async def _session_valid(self, page) -> bool:
+        """True if the loaded cookies still show a signed-in account in the nav bar."""
+        await page.goto(AMAZON_BASE, wait_until="domcontentloaded", timeout=45000)
+        greeting = page.locator("#nav-link-accountList-nav-line-1")
+        if not await greeting.count():
+            return False
+        return "sign in" not in (await greeting.inner_text()).lower()
+
+    async def _login(self, page):
+        """Headless login to Amazon. Requires AMAZON_EMAIL/PASSWORD; supports TOTP 2FA if provided."""
+        if not (AMAZON_EMAIL and AMAZON_PASSWORD):
+            raise FetchError("AMAZON_EMAIL and AMAZON_PASSWORD must be set for mandatory Amazon login.")
+
+        await page.goto("https://www.amazon.co.uk/ap/signin", wait_until="domcontentloaded", timeout=60000)
+        await page.locator("input#ap_email").fill(AMAZON_EMAIL)
+        await page.locator("input#continue").click()
+        await page.wait_for_selector("input#ap_password", timeout=20000)
+        await page.locator("input#ap_password").fill(AMAZON_PASSWORD)
+        await page.locator("input#signInSubmit").click()
+
+        # If authenticator-based 2FA is enabled
+        try:
+            if await page.locator("input#auth-mfa-otpcode").count():
+                if not AMAZON_TOTP_SECRET:
+                    raise FetchError("Amazon requested OTP but AMAZON_TOTP_SECRET is not set (use authenticator-app TOTP).")
+                import pyotp
+                otp = pyotp.TOTP(AMAZON_TOTP_SECRET).now()
+                await page.locator("input#auth-mfa-otpcode").fill(otp)
+                await page.locator("input#auth-signin-button").click()
+                await page.wait_for_load_state("domcontentloaded", timeout=25000)
+                await page.wait_for_timeout(800)
+        except Exception:
+            # If no OTP field appears, continue
+            pass
+
+        await page.goto(AMAZON_BASE, wait_until="domcontentloaded", timeout=45000)
+
+    async def _ensure_login(self, page):
+        async with self._login_lock:
+            if self._logged_in:
+                return
+            self._status = "logging_in"
+            try:
+                if not (self._state_loaded and await self._session_valid(page)):
+                    await self._login(page)
+                    await self._ctx.storage_state(path=self.state_path)
+                    try:
+                        os.chmod(self.state_path, 0o600)  # session cookies
+                    except OSError:
+                        pass
+                    self._state_loaded = True
+            except Exception as e:
+                self._status, self._last_error = "failed", f"{type(e).__name__}: {e}"
+                raise
+            self._logged_in = True
+            self._status, self._ready_at, self._last_error = "ready", time.time(), None
+
+    async def _fetch(self, url: str, polite: bool = True):
+        """(html, PageFetchStats) for one URL, on the next free page; retried once if the browser or tab crashes."""
+        for attempt in (0, 1):
+            await self._start()
+            gen = self._gen
+            t0 = time.perf_counter()
+            page = await self._pool.get()
+            queue_ms = round((time.perf_counter() - t0) * 1000, 1)
+            try:
+                return await self._fetch_on(page, url, polite, queue_ms)
+            except Exception as e:
+                if attempt or not self._broken(page):
+                    raise
+                self._last_error = f"{type(e).__name__}: {e}"
+                if self._browser is None or not self._browser.is_connected():
+                    await self._restart(gen)
+            finally:
+                self._active.pop(page, None)
+                if not page.is_closed():
+                    self._give_back(page)
+                elif gen == self._gen and not self._closing:
+                    self._pages.discard(page)  # only the tab died: replace it
+                    try:
+                        await self._new_page()
+                    except Exception:
+                        pass  # the browser went too; the relaunch refills the pool
+
+    async def _fetch_on(self, page, url: str, polite: bool, queue_ms: float):
+        stats = PageFetchStats(url=url, queue_ms=queue_ms)
+        ms = lambda t0: round((time.perf_counter() - t0) * 1000, 1)
+        t0 = time.perf_counter()
+        await self._ensure_login(page)
+        stats.login_ms = ms(t0)
+        limiter = host_limiter(url)
+        if polite:
+            t0 = time.perf_counter()
+            await limiter.acquire_async()
+            stats.sleep_ms = ms(t0)
+        self._active[page] = stats
+        t0 = time.perf_counter()
+        resp = await page.goto(url, wait_until="domcontentloaded", timeout=60000)
+        if "/ap/signin" in page.url:  # saved session expired mid-run
+            del self._active[page]
+            self._logged_in = False
+            self._state_loaded = False
+            self._relogins += 1
+            t0 = time.perf_counter()
+            await self._ensure_login(page)
+            stats.login_ms += ms(t0)
+            stats.bytes_loaded = stats.requests_blocked = stats.est_bytes_saved = 0
+            self._active[page] = stats
+            t0 = time.perf_counter()
+            resp = await page.goto(url, wait_until="domcontentloaded", timeout=60000)
+        stats.load_ms = ms(t0)
+        if (resp is not None and resp.status in (429, 503)) or "/errors/validateCaptcha" in page.url:
+            retry_after = _retry_after_seconds(resp.headers.get("retry-after")) if resp is not None else None
+            limiter.on_throttle(retry_after)
+        else:
+            limiter.on_success()
+        t0 = time.perf_counter()
+        await page.wait_for_timeout(700 + random.randint(0, 400))
+        stats.settle_ms = ms(t0)
+        t0 = time.perf_counter()
+        html = await page.content()
+        stats.content_ms = ms(t0)
+        sizing = self._sizing.pop(id(stats), None)
+        if sizing:
+            await asyncio.wait(sizing, timeout=5)
+        self.fetch_stats.append(stats)
+        self._fetches += 1
+        return html, stats
+
+    @staticmethod
+    def _record(stats: PageFetchStats):
+        """Copy one page fetch into the caller's scan metrics (runs on the calling thread)."""
+        host = _host(stats.url)
+        for stage in ("queue", "login", "sleep", "load", "settle", "content"):
+            seconds = getattr(stats, f"{stage}_ms") / 1000
+            if seconds or stage == "load":
+                m = _metrics_var.get()
+                if m is not None:
+                    m.observe(f"browser_{stage}", seconds, host)
+        _count("requests", host=host, status="browser")
+        _count("bytes", stats.bytes_loaded, host=host)
+        _count("browser_requests_blocked", stats.requests_blocked, host=host)
+
+    def fetch(self, url: str, polite: bool = True) -> str:
+        html, stats = self._call(self._fetch(url, polite))
+        self._record(stats)
+        return html
+
+    def fetch_many(self, urls: List[str], polite: bool = True) -> List[str]:
+        """Fetch several URLs in parallel across the page pool; results keep the input order."""
+        async def _many():
+            return await asyncio.gather(*(self._fetch(u, polite) for u in urls))
+        out = []
+        for html, stats in self._call(_many()):
+            self._record(stats)
+            out.append(html)
+        return out
+
+_amazon_browser: Optional[AmazonBrowser] = None
+_amazon_browser_lock = threading.Lock()
+
+def amazon_browser() -> AmazonBrowser:
+    global _amazon_browser
+    with _amazon_browser_lock:
+        if _amazon_browser is None:
+            _amazon_browser = AmazonBrowser()
+        return _amazon_browser
+
+def _is_amazon(url: str) -> bool:
+    return "amazon.co.uk" in url or "amazon.com" in url
 
 def _playwright_get_html_as_logged_in(url: str) -> str:
-    _amazon_login()
-    _, page = _ensure_playwright()
-    page.goto(url, wait_until="domcontentloaded", timeout=60000)
-    page.wait_for_timeout(700 + random.randint(0, 400))
-    return page.content()
+    return amazon_browser().fetch(url, polite=False)
+
+class _Resp:
+    def __init__(self, text: str): self.text = text
 
 def get(url: str):
     """
@@ -168,15 +1143,102 @@ def get(url: str):
     - Others (eBay): requests with retries.
     Returns an object with .text attribute.
     """
-    class Resp:
-        def __init__(self, text: str): self.text = text
-
-    if "amazon.co.uk" in url or "amazon.com" in url:
+    if _is_amazon(url):
         html = _playwright_get_html_as_logged_in(url)
-        return Resp(html)
+        return _Resp(html)
     return _requests_get(url)
 
+def get_many(urls: List[str]) -> List[str]:
+    """Polite fetch of several pages, in input order. Amazon pages load in parallel across the browser's page pool."""
+    if urls and all(_is_amazon(u) for u in urls):
+        return amazon_browser().fetch_many(urls)
+    return [amazon_browser().fetch(u) if _is_amazon(u) else _polite_get(u).text for u in urls]
+
 # ---------------- Parsing helpers ----------------
+def _resolve_parser(name: str) -> str:
+    """BeautifulSoup tree builder: lxml (C, fast) when available, else the pure-Python html.parser."""
+    if name in ("auto", "lxml"):
+        try:
+            import lxml  # noqa: F401
+            return "lxml"
+        except ImportError:
+            if name == "lxml":
+                raise
+    return "html.parser"
+
+PARSER_BACKEND = _resolve_parser(HTML_PARSER)
+
+def _has_class(*names: str):
+    """SoupStrainer class matcher; bs4 may hand over the raw multi-class string, so split it ourselves."""
+    wanted = set(names)
+    return lambda value: value is not None and not wanted.isdisjoint(value.split())
+
+# Strainers: only these subtrees are built, everything else in the page is skipped while parsing
+ONLY_CATEGORY_LINKS = SoupStrainer("a", href=re.compile(r"/gp/bestsellers/"))
+ONLY_BESTSELLER_CARDS = SoupStrainer("div", class_=_has_class("zg-grid-general-faceout", "_cDEzb_grid-cell_1uMOS", "aok-relative"))
+ONLY_EBAY_ITEMS = SoupStrainer("li", class_=_has_class("s-item"))
+
+def make_soup(html: str, only: Optional[SoupStrainer] = None, parser: Optional[str] = None) -> BeautifulSoup:
+    """
+    Parse HTML with the configured backend. `only` restricts the tree to the strained subtrees
+    (ignored when SCRAPER_PARSE_ONLY=0); the selectors used by the scrapers give the same
+    results either way.
+    """
+    return BeautifulSoup(html, parser or PARSER_BACKEND, parse_only=only if HTML_PARSE_ONLY else None)
+
+# Parsing is CPU-bound and would serialize fetcher threads on the GIL, so it can run in a process
+# pool: fetchers hand raw HTML over (blocking once PARSE_QUEUE_DEPTH pages are waiting) and get
+# compact records back.
+def _parse_worker_init(backend: str, parse_only: bool):
+    global PARSER_BACKEND, HTML_PARSE_ONLY
+    PARSER_BACKEND, HTML_PARSE_ONLY = backend, parse_only
+
+def _run_parse(fn, *args):
+    """Runs in a pool process: (result, parse seconds)."""
+    t0 = time.perf_counter()
+    return fn(*args), time.perf_counter() - t0
+
+def new_parse_pool(workers: int) -> ProcessPoolExecutor:
+    # spawn, not fork: the parent has live threads (fetchers, the Playwright loop)
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                               initializer=_parse_worker_init, initargs=(PARSER_BACKEND, HTML_PARSE_ONLY))
+
+_parse_pool: Optional[ProcessPoolExecutor] = None
+_parse_pool_lock = threading.Lock()
+_parse_slots = threading.BoundedSemaphore(max(1, PARSE_QUEUE_DEPTH))
+
+def parse_pool() -> Optional[ProcessPoolExecutor]:
+    """Process-wide parse pool, or None when parsing runs inline (SCRAPER_PARSE_WORKERS=0 or one core)."""
+    global _parse_pool
+    if PARSE_WORKERS <= 0:
+        return None
+    with _parse_pool_lock:
+        if _parse_pool is None:
+            _parse_pool = new_parse_pool(PARSE_WORKERS)
+    return _parse_pool
+
+def _parse(stage: str, fn, *args):
+    """fn(*args) on the parse pool (inline without one); parse time is recorded under `stage`."""
+    global _parse_pool
+    pool = parse_pool()
+    if pool is None:
+        return fn(*args)  # parse functions time themselves
+    t0 = time.perf_counter()
+    try:
+        with _parse_slots:
+            result, seconds = pool.submit(_run_parse, fn, *args).result()
+    except BrokenProcessPool:
+        with _parse_pool_lock:
+            if _parse_pool is pool:
+                _parse_pool = None  # a worker died; the next call starts a fresh pool
+        _count("parse_pool_errors")
+        return fn(*args)
+    m = _metrics_var.get()
+    if m is not None:
+        m.observe(stage, seconds)
+        m.observe("parse_wait", max(0.0, time.perf_counter() - t0 - seconds))
+    return result
+
 _price_re = re.compile(r"£\s*([0-9]+(?:[\.,][0-9]{1,2})?)")
 def parse_price_gbp(text: str) -> Optional[float]:
     if not text:
@@ -220,8 +1282,9 @@ class EbayResult:
     price_gbp: Optional[float]
     shipping_gbp: float
     url: str
+    match_score: Optional[float] = None  # title similarity to the Amazon product (None = not matched)
 
-@dataclass
+@dataclass(slots=True)
 class OpportunityRow:
     title: str
     amazon_price: Optional[float]
@@ -240,6 +1303,384 @@ class OpportunityRow:
     category_url: str
     image_url: Optional[str]
     sold_recent: int
+    category_urls: List[str] = field(default_factory=list)  # every category the ASIN appeared in
+
+@dataclass
+class ScanSummary:
+    categories: int = 0
+    products: int = 0           # unique products looked up on eBay
+    duplicate_asins: int = 0    # repeat appearances skipped (2 eBay requests saved each)
+    coalesced_requests: int = 0  # eBay page fetches shared with an identical query in this run
+    fetches_pruned: int = 0     # eBay fetches skipped because the item already failed a filter
+    history_reused: int = 0     # eBay fetches answered from the price history (incremental scans)
+    rows: int = 0
+    scan_id: Optional[int] = None  # PriceHistory scan id, when history is enabled
+
+    @property
+    def requests_saved(self) -> int:
+        return 2 * self.duplicate_asins + self.coalesced_requests + self.history_reused
+
+    def to_dict(self) -> dict:
+        """JSON-ready fields plus requests_saved; the one serialized shape for jobs, checkpoints and shards."""
+        return dict(asdict(self), requests_saved=self.requests_saved)
+
+@dataclass
+class ScanEvent:
+    """Progress/result event streamed by iter_opportunities."""
+    kind: str  # category_start | product | row | category_done | done
+    category_url: str = ""
+    category_index: int = 0
+    category_total: int = 0
+    product_index: int = 0
+    product_total: int = 0
+    row: Optional[OpportunityRow] = None
+    rows_found: int = 0
+    summary: Optional[ScanSummary] = None  # set on the final "done" event
+    metrics: Optional[ScanMetrics] = None  # set on the final "done" event
+    delta: Optional['ScanDelta'] = None  # set on the final "done" event when history is enabled
+    candidates: Optional['CandidateBatch'] = None  # set on the final "done" event
+
+    @property
+    def progress(self) -> float:
+        """Overall completion in [0, 1]."""
+        if self.kind == "done" or not self.category_total:
+            return 1.0
+        within = self.product_index / self.product_total if self.product_total else 0.0
+        if self.kind == "category_done":
+            within = 1.0
+        return min(1.0, (self.category_index + within) / self.category_total)
+
+# ---------------- Candidate batch (columnar, vectorized profit/filter) ----------------
+class CandidateBatch:
+    """
+    Every product a scan looked up, with its eBay signals, unfiltered and stored column-wise:
+    numeric columns are NumPy arrays (NaN = missing / not fetched), text columns plain lists.
+    evaluate() computes fee, profit, margin and the threshold mask for a slice in one vectorized
+    pass; rows()/filter() turn the passing indices into OpportunityRow views.
+    """
+    _FLOAT = ("amazon_price", "ebay_price", "ebay_shipping", "sold_recent", "rating", "reviews")
+    _BOOL = ("prime", "price_checked", "sold_checked")
+    _TEXT = ("title", "asin", "amazon_url", "ebay_url", "category_url", "image_url")
+
+    def __init__(self, capacity: int = 64):
+        self._n = 0
+        self._cols: Dict[str, np.ndarray] = {c: np.full(capacity, np.nan) for c in self._FLOAT}
+        self._cols.update({c: np.zeros(capacity, dtype=bool) for c in self._BOOL})
+        self._text: Dict[str, list] = {c: [] for c in self._TEXT}
+        self.category_urls: List[List[str]] = []
+
+    def __len__(self) -> int:
+        return self._n
+
+    def column(self, name: str) -> np.ndarray:
+        """Read-only view of a numeric/flag column (no copy)."""
+        view = self._cols[name][:self._n]
+        view.flags.writeable = False
+        return view
+
+    def text(self, name: str) -> list:
+        return self._text[name]
+
+    def append(self, p: AmazonProduct, best: Optional[EbayResult], sold_recent: Optional[int],
+               price_checked: bool = True, category_urls: Optional[List[str]] = None) -> int:
+        """Add one looked-up product; returns its index."""
+        i = self._n
+        if i == len(self._cols["prime"]):
+            for name, col in self._cols.items():
+                grown = np.full(2 * len(col), np.nan) if col.dtype.kind == "f" else np.zeros(2 * len(col), dtype=bool)
+                grown[:i] = col
+                self._cols[name] = grown
+        nan = lambda v: np.nan if v is None else v
+        values = {"amazon_price": nan(p.price_gbp), "ebay_price": nan(best.price_gbp) if best else np.nan,
+                  "ebay_shipping": best.shipping_gbp if best else 0.0, "sold_recent": nan(sold_recent),
+                  "rating": nan(p.rating), "reviews": nan(p.reviews_count), "prime": p.prime,
+                  "price_checked": price_checked, "sold_checked": sold_recent is not None}
+        for name, v in values.items():
+            self._cols[name][i] = v
+        for name, v in (("title", p.title), ("asin", p.asin), ("amazon_url", p.url),
+                        ("ebay_url", best.url if best else ""), ("category_url", p.category_url),
+                        ("image_url", p.image_url)):
+            self._text[name].append(v)
+        self.category_urls.append(category_urls if category_urls is not None else [p.category_url])
+        self._n += 1
+        return i
+
+    def evaluate(self, min_profit: float, min_margin: float, min_sold_recent: int, fee_rate: float, fixed_fee: float,
+                 start: int = 0, stop: Optional[int] = None) -> Dict[str, np.ndarray]:
+        """Vectorized estimate_profit + threshold check over rows [start, stop); "mask" marks the passing rows."""
+        s = slice(start, self._n if stop is None else stop)
+        total = self._cols["ebay_price"][s] + self._cols["ebay_shipping"][s]
+        fee = total * fee_rate + fixed_fee
+        profit = total - self._cols["amazon_price"][s] - fee
+        with np.errstate(divide="ignore", invalid="ignore"):
+            margin = np.where(total != 0, profit / total, np.nan)
+        sold = self._cols["sold_recent"][s]
+        mask = (np.isfinite(profit) & np.isfinite(margin) & (sold >= min_sold_recent)
+                & (profit >= min_profit) & (margin >= min_margin))
+        return {"mask": mask, "ebay_total_price": total, "estimated_ebay_fee": fee, "est_profit_gbp": profit,
+                "est_margin": margin}
+
+    def rows(self, indices, ev: Dict[str, np.ndarray], start: int = 0) -> List[OpportunityRow]:
+        """OpportunityRow views of batch rows `indices`, using an evaluate() result that began at `start`."""
+        c, t = self._cols, self._text
+        num = lambda v: None if np.isnan(v) else float(v)
+        out = []
+        for i in indices:
+            j = i - start
+            out.append(OpportunityRow(
+                title=t["title"][i], amazon_price=num(c["amazon_price"][i]), ebay_price=num(c["ebay_price"][i]),
+                ebay_shipping=float(c["ebay_shipping"][i]), ebay_total_price=num(ev["ebay_total_price"][j]),
+                estimated_ebay_fee=num(ev["estimated_ebay_fee"][j]), est_profit_gbp=num(ev["est_profit_gbp"][j]),
+                est_margin=num(ev["est_margin"][j]), prime=bool(c["prime"][i]),
+                rating=num(c["rating"][i]), reviews=None if np.isnan(c["reviews"][i]) else int(c["reviews"][i]),
+                amazon_url=t["amazon_url"][i], ebay_url=t["ebay_url"][i], asin=t["asin"][i],
+                category_url=t["category_url"][i], image_url=t["image_url"][i],
+                sold_recent=int(c["sold_recent"][i]), category_urls=self.category_urls[i]))
+        return out
+
+    def avoided(self, avoid_keywords: Optional[List[str]]) -> np.ndarray:
+        """Mask of rows whose title contains any of the keywords (case-insensitive, as in the scan)."""
+        keys = [k.lower() for k in avoid_keywords or []]
+        return np.fromiter((any(k in t.lower() for k in keys) for t in self._text["title"]), dtype=bool, count=self._n)
+
+    def filter(self, min_profit: float, min_margin: float, min_sold_recent: int, fee_rate: float,
+               fixed_fee: float, avoid_keywords: Optional[List[str]] = None) -> List[OpportunityRow]:
+        """Passing rows for these thresholds, in scan order (no refetching)."""
+        ev = self.evaluate(min_profit, min_margin, min_sold_recent, fee_rate, fixed_fee)
+        mask = ev["mask"] & ~self.avoided(avoid_keywords) if avoid_keywords else ev["mask"]
+        return self.rows(np.flatnonzero(mask), ev)
+
+    def undetermined(self, min_profit: float, min_margin: float, min_sold_recent: int, fee_rate: float,
+                     fixed_fee: float, avoid_keywords: Optional[List[str]] = None) -> int:
+        """
+        Rows that might pass these thresholds but can't be decided here: the scan pruned one of
+        their eBay fetches, and the signal it did fetch doesn't rule them out.
+        """
+        ev = self.evaluate(min_profit, min_margin, min_sold_recent, fee_rate, fixed_fee)
+        price_checked, sold_checked = self.column("price_checked"), self.column("sold_checked")
+        price_ok = np.isfinite(ev["est_profit_gbp"]) & np.isfinite(ev["est_margin"]) \
+            & (ev["est_profit_gbp"] >= min_profit) & (ev["est_margin"] >= min_margin)
+        could_pass = (price_ok | ~price_checked) & ((self.column("sold_recent") >= min_sold_recent) | ~sold_checked)
+        mask = could_pass & ~(price_checked & sold_checked)
+        if avoid_keywords:
+            mask &= ~self.avoided(avoid_keywords)
+        return int(mask.sum())
+
+    def to_dict(self) -> dict:
+        """JSON-ready columns (None for NaN)."""
+        cols = {name: [None if v != v else v for v in self.column(name).tolist()] for name in self._FLOAT}
+        cols.update({name: self.column(name).tolist() for name in self._BOOL})
+        cols.update({name: list(values) for name, values in self._text.items()})
+        cols["category_urls"] = self.category_urls
+        return cols
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "CandidateBatch":
+        n = len(data["title"])
+        batch = cls(capacity=max(1, n))
+        for name in cls._FLOAT:
+            batch._cols[name][:n] = [np.nan if v is None else v for v in data[name]]
+        for name in cls._BOOL:
+            batch._cols[name][:n] = data[name]
+        batch._text = {name: list(data[name]) for name in cls._TEXT}
+        batch.category_urls = [list(urls) for urls in data["category_urls"]]
+        batch._n = n
+        return batch
+
+def rows_to_columns(rows: List[OpportunityRow]) -> Dict[str, object]:
+    """Column-wise copy of rows (NumPy arrays for numbers) plus est_margin_pct, e.g. for pd.DataFrame(...)."""
+    cols: Dict[str, object] = {f.name: [getattr(r, f.name) for r in rows] for f in fields(OpportunityRow)}
+    for name in ("amazon_price", "ebay_price", "ebay_shipping", "ebay_total_price", "estimated_ebay_fee",
+                 "est_profit_gbp", "est_margin", "rating"):
+        cols[name] = np.array([np.nan if v is None else v for v in cols[name]], dtype=float)
+    cols["est_margin_pct"] = np.round(cols["est_margin"] * 100, 2)
+    return cols
+
+# ---------------- Price history (SQLite time series + incremental rescans) ----------------
+@dataclass
+class KnownSignals:
+    """Stored eBay signals for one product that are still fresh enough to reuse."""
+    best: Optional[EbayResult]
+    price_checked: bool          # False -> best was never fetched (or is stale)
+    sold_recent: Optional[int]   # None -> never fetched (or stale)
+
+@dataclass
+class ScanDelta:
+    """Opportunity changes between a scan and the previous complete scan of the same categories."""
+    scan_id: int
+    previous_scan_id: Optional[int]
+    new: List[OpportunityRow] = field(default_factory=list)
+    dropped: List[OpportunityRow] = field(default_factory=list)
+    moved: List[Tuple[OpportunityRow, OpportunityRow]] = field(default_factory=list)  # (before, after)
+
+class PriceHistory:
+    """
+    Local time series of Amazon price, eBay best total and sold counts per (ASIN, eBay query),
+    plus the opportunity rows of every scan for delta reports.
+    `observations` is append-only; `latest` holds the current value and timestamp of each signal.
+    """
+
+    def __init__(self, path: str = HISTORY_PATH):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS observations ("
+            " asin TEXT NOT NULL, query TEXT NOT NULL, observed_at REAL NOT NULL, scan_id INTEGER,"
+            " amazon_price REAL, ebay_price REAL, ebay_shipping REAL, sold_recent INTEGER);"
+            "CREATE INDEX IF NOT EXISTS observations_key ON observations (asin, query, observed_at);"
+            "CREATE TABLE IF NOT EXISTS latest ("
+            " asin TEXT NOT NULL, query TEXT NOT NULL, amazon_price REAL,"
+            " ebay_title TEXT, ebay_price REAL, ebay_shipping REAL, ebay_url TEXT, price_at REAL,"
+            " sold_recent INTEGER, sold_at REAL, price_settings TEXT, sold_settings TEXT, PRIMARY KEY (asin, query));"
+            "CREATE TABLE IF NOT EXISTS scans ("
+            " scan_id INTEGER PRIMARY KEY AUTOINCREMENT, scope TEXT NOT NULL, params TEXT NOT NULL,"
+            " started_at REAL NOT NULL, finished_at REAL, complete INTEGER NOT NULL DEFAULT 0);"
+            "CREATE TABLE IF NOT EXISTS scan_rows ("
+            " scan_id INTEGER NOT NULL, key TEXT NOT NULL, row TEXT NOT NULL, PRIMARY KEY (scan_id, key));"
+        )
+        cols = {r[1] for r in self._conn.execute("PRAGMA table_info(latest)")}
+        for col in ("price_settings", "sold_settings"):  # histories written before these existed
+            if col not in cols:
+                self._conn.execute(f"ALTER TABLE latest ADD COLUMN {col} TEXT")
+        self._conn.commit()
+
+    @staticmethod
+    def scope(categories: List[str]) -> str:
+        return json.dumps(sorted(ResponseCache.normalize(c) for c in categories))
+
+    @staticmethod
+    def row_key(row: OpportunityRow) -> str:
+        return row.asin or row.amazon_url
+
+    def known(self, asin: Optional[str], query: str, amazon_price: Optional[float],
+              fresh_for: float = HISTORY_FRESH_FOR, price_tolerance: float = HISTORY_PRICE_TOLERANCE,
+              price_settings: str = "", sold_settings: str = "") -> Optional[KnownSignals]:
+        """
+        Reusable signals, or None when the item is new or its Amazon price moved by more than price_tolerance.
+        A signal is only reused when it was fetched with the same price_settings/sold_settings (the
+        lookup settings that shape it, e.g. max results and match threshold).
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT amazon_price, ebay_title, ebay_price, ebay_shipping, ebay_url, price_at, sold_recent, sold_at,"
+                " price_settings, sold_settings FROM latest WHERE asin = ? AND query = ?", (asin or "", query)
+            ).fetchone()
+        if row is None:
+            return None
+        old_price, title, price, shipping, url, price_at, sold_recent, sold_at, old_pset, old_sset = row
+        if (old_price is None) != (amazon_price is None):
+            return None
+        if old_price is not None and abs(amazon_price - old_price) > price_tolerance * max(old_price, 0.01):
+            return None
+        cutoff = time.time() - fresh_for
+        price_ok = price_at is not None and price_at >= cutoff and (old_pset or "") == price_settings
+        sold_ok = sold_at is not None and sold_at >= cutoff and (old_sset or "") == sold_settings
+        if not (price_ok or sold_ok):
+            return None
+        best = EbayResult(title=title or "", price_gbp=price, shipping_gbp=shipping or 0.0, url=url or "") \
+            if price_ok and price is not None else None
+        return KnownSignals(best, price_ok, sold_recent if sold_ok else None)
+
+    def record(self, asin: Optional[str], query: str, amazon_price: Optional[float], scan_id: Optional[int] = None,
+               best: Optional[EbayResult] = None, price_checked: bool = False, sold_recent: Optional[int] = None,
+               price_settings: str = "", sold_settings: str = ""):
+        """Append an observation of the freshly fetched signals and fold them into `latest`."""
+        now, key = time.time(), (asin or "", query)
+        ebay_price = best.price_gbp if best else None
+        ebay_shipping = best.shipping_gbp if best else None
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO observations (asin, query, observed_at, scan_id, amazon_price, ebay_price, ebay_shipping,"
+                " sold_recent) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (*key, now, scan_id, amazon_price, ebay_price if price_checked else None,
+                 ebay_shipping if price_checked else None, sold_recent),
+            )
+            self._conn.execute("INSERT OR IGNORE INTO latest (asin, query) VALUES (?, ?)", key)
+            self._conn.execute("UPDATE latest SET amazon_price = ? WHERE asin = ? AND query = ?", (amazon_price, *key))
+            if price_checked:
+                self._conn.execute(
+                    "UPDATE latest SET ebay_title = ?, ebay_price = ?, ebay_shipping = ?, ebay_url = ?, price_at = ?,"
+                    " price_settings = ? WHERE asin = ? AND query = ?",
+                    (best.title if best else None, ebay_price, ebay_shipping, best.url if best else None, now,
+                     price_settings, *key),
+                )
+            if sold_recent is not None:
+                self._conn.execute("UPDATE latest SET sold_recent = ?, sold_at = ?, sold_settings = ?"
+                                   " WHERE asin = ? AND query = ?", (sold_recent, now, sold_settings, *key))
+            self._conn.commit()
+
+    def series(self, asin: str) -> List[dict]:
+        """Every observation for an ASIN, oldest first."""
+        cols = ("query", "observed_at", "scan_id", "amazon_price", "ebay_price", "ebay_shipping", "sold_recent")
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {', '.join(cols)} FROM observations WHERE asin = ? ORDER BY observed_at", (asin,)
+            ).fetchall()
+        return [dict(zip(cols, r)) for r in rows]
+
+    def start_scan(self, categories: List[str], params: dict) -> int:
+        with self._lock:
+            cur = self._conn.execute("INSERT INTO scans (scope, params, started_at) VALUES (?, ?, ?)",
+                                     (self.scope(categories), json.dumps(params, default=str), time.time()))
+            self._conn.commit()
+            return cur.lastrowid
+
+    def finish_scan(self, scan_id: int, rows: List[OpportunityRow], complete: bool = True):
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO scan_rows (scan_id, key, row) VALUES (?, ?, ?)",
+                                   [(scan_id, self.row_key(r), json.dumps(asdict(r))) for r in rows])
+            self._conn.execute("UPDATE scans SET finished_at = ?, complete = ? WHERE scan_id = ?",
+                               (time.time(), int(complete), scan_id))
+            self._conn.commit()
+
+    def scan_rows(self, scan_id: int) -> Dict[str, OpportunityRow]:
+        with self._lock:
+            rows = self._conn.execute("SELECT key, row FROM scan_rows WHERE scan_id = ?", (scan_id,)).fetchall()
+        return {key: OpportunityRow(**json.loads(row)) for key, row in rows}
+
+    def previous_scan(self, scan_id: int) -> Optional[int]:
+        """The last complete scan of the same categories before scan_id."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT scan_id FROM scans WHERE complete = 1 AND scan_id < ?"
+                " AND scope = (SELECT scope FROM scans WHERE scan_id = ?) ORDER BY scan_id DESC LIMIT 1",
+                (scan_id, scan_id),
+            ).fetchone()
+        return row[0] if row else None
+
+    def delta(self, scan_id: int, previous_scan_id: Optional[int] = None, min_move: float = HISTORY_MIN_MOVE) -> ScanDelta:
+        """New, dropped and price-moved opportunities (estimated profit changed by >= min_move GBP)."""
+        prev_id = previous_scan_id if previous_scan_id is not None else self.previous_scan(scan_id)
+        now = self.scan_rows(scan_id)
+        before = self.scan_rows(prev_id) if prev_id is not None else {}
+        out = ScanDelta(scan_id, prev_id)
+        if prev_id is None:
+            return out
+        for key, row in now.items():
+            old = before.get(key)
+            if old is None:
+                out.new.append(row)
+            elif abs((row.est_profit_gbp or 0.0) - (old.est_profit_gbp or 0.0)) >= min_move:
+                out.moved.append((old, row))
+        out.dropped = [row for key, row in before.items() if key not in now]
+        return out
+
+_history: Optional[PriceHistory] = None
+_history_lock = threading.Lock()
+
+def price_history() -> Optional[PriceHistory]:
+    """Process-wide history store, or None when disabled (SCRAPER_HISTORY=0) or the file can't be opened."""
+    global _history, HISTORY_ENABLED
+    if not HISTORY_ENABLED:
+        return None
+    with _history_lock:
+        if _history is None:
+            try:
+                _history = PriceHistory()
+            except sqlite3.Error:
+                HISTORY_ENABLED = False
+                return None
+    return _history
 
 # ---------------- Amazon scraping ----------------
 DEFAULT_SEED_CATEGORIES = [
@@ -259,7 +1700,8 @@ def discover_best_seller_categories(max_categories: int = 20) -> List[str]:
     found: Set[str] = set()
     try:
         resp = get(AMAZON_BEST_ROOT)
-        soup = BeautifulSoup(resp.text, "html.parser")
+        with _stage("parse_categories"):
+            soup = make_soup(resp.text, ONLY_CATEGORY_LINKS)
         anchors = soup.select("a[href*='/gp/bestsellers/']")
         for a in anchors:
             href = a.get("href","")
@@ -333,55 +1775,187 @@ def parse_amazon_bestseller_card(card, category_url: str) -> Optional[AmazonProd
     )
 
 def scrape_amazon_bestsellers(category_url: str, max_items: int = 50) -> List[AmazonProduct]:
+    """
+    Top max_items priced products of a Best Seller category. pg=1 is loaded first; only when it
+    falls short are the further pages needed (at most up to pg=3, estimated from pg=1's yield)
+    loaded, in parallel.
+    """
+    urls = [category_url + ("&" if "?" in category_url else "?") + f"pg={pg}" for pg in [1, 2, 3]]
+    out = _parse("parse_amazon", parse_bestseller_page, get_many(urls[:1])[0], category_url)  # logged-in Playwright Firefox
+    if len(out) >= max_items or not out:
+        return out[:max_items]
+    more = -(-(max_items - len(out)) // len(out))  # pages still needed at pg=1's yield
+    for html in get_many(urls[1:1 + more]):
+        out.extend(_parse("parse_amazon", parse_bestseller_page, html, category_url))
+        if len(out) >= max_items:
+            return out[:max_items]
+    return out
+
+@_timed("parse_amazon")
+def parse_bestseller_page(html: str, category_url: str) -> List[AmazonProduct]:
+    """Priced, titled products of one Best Seller page, in page order."""
+    soup = make_soup(html, ONLY_BESTSELLER_CARDS)
+    cards = soup.select("div.zg-grid-general-faceout, div._cDEzb_grid-cell_1uMOS") or soup.select("div.a-section.a-spacing-none.aok-relative")
     out: List[AmazonProduct] = []
-    for pg in [1, 2, 3]:
-        url = category_url + ("&" if "?" in category_url else "?") + f"pg={pg}"
-        sleep_polite()
-        resp = get(url)  # logged-in Playwright Firefox
-        soup = BeautifulSoup(resp.text, "html.parser")
-        cards = soup.select("div.zg-grid-general-faceout, div._cDEzb_grid-cell_1uMOS") or soup.select("div.a-section.a-spacing-none.aok-relative")
-        for c in cards:
-            prod = parse_amazon_bestseller_card(c, category_url=category_url)
-            if prod and prod.price_gbp is not None and prod.title:
-                out.append(prod)
-                if len(out) >= max_items:
-                    return out
+    for c in cards:
+        prod = parse_amazon_bestseller_card(c, category_url=category_url)
+        if prod and prod.price_gbp is not None and prod.title:
+            out.append(prod)
     return out
 
+# ---------------- Title matching (eBay listing vs. Amazon product) ----------------
+_MATCH_NGRAM = 3
+_match_norm_re = re.compile(r"[^a-z0-9]+")
+_new_listing_re = re.compile(r"^\s*new listing\s*", re.I)
+
+def _match_text(text: str) -> str:
+    return " " + _match_norm_re.sub(" ", text.lower()).strip() + " "
+
+def _ngram_tfidf(texts: List[str]) -> np.ndarray:
+    """
+    L2-normalised TF-IDF rows over hashed character n-grams of texts, built in one vectorized pass:
+    every n-gram of every text is hashed at once, the hashes are mapped to a compact vocabulary
+    with np.unique and counted with np.bincount. IDF comes from the texts themselves (one page).
+    """
+    n = _MATCH_NGRAM
+    docs = [_match_text(t).encode() for t in texts]
+    sizes = np.fromiter((len(d) for d in docs), dtype=np.int64, count=len(docs))
+    grams = np.maximum(sizes - n + 1, 0)
+    buf = np.frombuffer(b"".join(docs), dtype=np.uint8).astype(np.uint64)
+    starts = np.cumsum(sizes) - sizes
+    first = np.cumsum(grams) - grams
+    pos = np.repeat(starts - first, grams) + np.arange(int(grams.sum()))
+    h = np.zeros(len(pos), dtype=np.uint64)
+    for k in range(n):
+        h = h * np.uint64(257) + buf[pos + k]
+    vocab, cols = np.unique(h, return_inverse=True)
+    rows = np.repeat(np.arange(len(docs)), grams)
+    counts = np.bincount(rows * len(vocab) + cols, minlength=len(docs) * len(vocab)).reshape(len(docs), len(vocab))
+    present = counts > 0
+    tf = np.where(present, 1.0 + np.log(np.maximum(counts, 1)), 0.0)
+    idf = np.log((1.0 + len(docs)) / (1.0 + present.sum(axis=0))) + 1.0
+    w = tf * idf
+    norms = np.linalg.norm(w, axis=1, keepdims=True)
+    return w / np.where(norms > 0, norms, 1.0)
+
+def _model_tokens(words: List[str]) -> Set[str]:
+    """
+    Model numbers and sizes: words with a digit and 3+ characters (e.g. 5837, 128gb), plus each of
+    them joined to its neighbours, since "WH-1000XM4", "WH1000XM4" and "WH 1000XM4" all occur.
+    """
+    out = set()
+    for i, w in enumerate(words):
+        if len(w) >= 3 and any(c.isdigit() for c in w):
+            out.add(w)
+            if i:
+                out.add(words[i - 1] + w)
+            if i + 1 < len(words):
+                out.add(w + words[i + 1])
+    return out
+
+def title_match_scores(reference: str, titles: List[str], asin: Optional[str] = None) -> np.ndarray:
+    """
+    Similarity (0..1) of each eBay listing title to the first MATCH_REF_WORDS words of the Amazon
+    title reference: cosine of hashed character-trigram TF-IDF vectors, scaled by
+    MATCH_MISSING_PENALTY when the listing lacks the brand (the title's first word) or contains none
+    of the reference's model-number tokens (compared without spaces or hyphens). A listing quoting
+    the ASIN scores 1.
+    """
+    if not titles:
+        return np.zeros(0)
+    ref_words = _match_text(reference).split()[:MATCH_REF_WORDS]
+    w = _ngram_tfidf([" ".join(ref_words)] + list(titles))
+    scores = w[1:] @ w[0]
+    brand = ref_words[0] if ref_words and ref_words[0].isalpha() and len(ref_words[0]) > 1 else None
+    models = _model_tokens(ref_words)
+    needle = asin.lower() if asin else None
+    for i, title in enumerate(titles):
+        words = _match_text(title).split()
+        compact = "".join(words)
+        if needle and needle in words:
+            scores[i] = 1.0
+            continue
+        if brand and brand not in words:
+            scores[i] *= MATCH_MISSING_PENALTY
+        if models and not any(m in compact for m in models):
+            scores[i] *= MATCH_MISSING_PENALTY
+    return scores
+
+def _matching(titles: List[str], reference: Optional[str], asin: Optional[str], threshold: float):
+    """(indices of listings to keep, their scores); everything when matching is off."""
+    if not reference or threshold <= 0:
+        return list(range(len(titles))), [None] * len(titles)
+    scores = title_match_scores(reference, titles, asin)
+    keep = np.flatnonzero(scores >= threshold)
+    return keep.tolist(), scores[keep].round(3).tolist()
+
 # ---------------- eBay scraping (public) ----------------
-def scrape_ebay_best_price(query: str, max_results: int = 8) -> Optional['EbayResult']:
+def _listing_title(item) -> str:
+    title_el = item.select_one("div.s-item__title span[role='heading'], h3.s-item__title")
+    return _new_listing_re.sub("", title_el.get_text(" ", strip=True)) if title_el else ""
+
+def scrape_ebay_best_price(query: str, max_results: int = 8, use_cache: bool = True,
+                           flight: Optional[SingleFlight] = None, reference: Optional[str] = None,
+                           asin: Optional[str] = None, threshold: float = MATCH_THRESHOLD) -> Optional['EbayResult']:
     params = {"_nkw": query, "LH_BIN": "1", "LH_PrefLoc": "1", "LH_ItemCondition": "1000", "rt": "nc", "_sop": "15"}
     url = EBAY_SEARCH_URL + "?" + urllib.parse.urlencode(params)
-    sleep_polite()
-    resp = _requests_get(url)
-    soup = BeautifulSoup(resp.text, "html.parser")
-    items = soup.select("li.s-item")[:max_results]
+    if threshold <= 0:
+        reference = asin = None  # not matching: parse (and share) the page the same for every product
+    return _fetch_parsed(url, "price", CACHE_TTL_PRICE, use_cache, flight, "parse_ebay_price", parse_ebay_best_price,
+                         max_results, url, reference, asin, threshold)
+
+@_timed("parse_ebay_price")
+def parse_ebay_best_price(html: str, max_results: int = 8, page_url: str = "", reference: Optional[str] = None,
+                          asin: Optional[str] = None, threshold: float = MATCH_THRESHOLD) -> Optional['EbayResult']:
+    """
+    Cheapest (price + shipping) of the first max_results listings on an eBay search page. Given the
+    Amazon title as reference, up to MATCH_SCAN_RESULTS listings are scored and only those matching it
+    at least threshold count (the first max_results of them).
+    """
+    soup = make_soup(html, ONLY_EBAY_ITEMS)
+    items = soup.select("li.s-item")[:MATCH_SCAN_RESULTS if reference and threshold > 0 else max_results]
+    keep, scores = _matching([_listing_title(it) for it in items], reference, asin, threshold)
     best = None
-    for it in items:
-        title_el = it.select_one("div.s-item__title span[role='heading'], h3.s-item__title")
-        title = title_el.get_text(" ", strip=True) if title_el else ""
+    for i, score in list(zip(keep, scores))[:max_results]:  # price/shipping/link only for listings that count
+        it = items[i]
         price_el = it.select_one("span.s-item__price")
         price = parse_price_gbp(price_el.get_text(strip=True) if price_el else "")
         ship_el = it.select_one("span.s-item__shipping, span.s-item__logisticsCost")
         shipping = parse_price_gbp(ship_el.get_text(strip=True) if ship_el else "") or 0.0
         link_el = it.select_one("a.s-item__link")
-        link = link_el.get("href") if link_el else url
+        link = link_el.get("href") if link_el else page_url
         if price is None:
             continue
         total = price + shipping
         if best is None or total < (best.price_gbp or 9e9) + (best.shipping_gbp or 0):
-            best = EbayResult(title=title[:200], price_gbp=price, shipping_gbp=shipping, url=link)
+            best = EbayResult(title=_listing_title(it)[:200], price_gbp=price, shipping_gbp=shipping, url=link,
+                              match_score=score)
     return best
 
-def ebay_sold_count_html(query: str, max_scan: int = 20) -> int:
+def ebay_sold_count_html(query: str, max_scan: int = 20, use_cache: bool = True,
+                         flight: Optional[SingleFlight] = None, reference: Optional[str] = None,
+                         asin: Optional[str] = None, threshold: float = MATCH_THRESHOLD) -> int:
     params = {"_nkw": query, "LH_Sold": "1", "LH_Complete": "1", "rt": "nc", "_sop": "10"}
     url = EBAY_SEARCH_URL + "?" + urllib.parse.urlencode(params)
-    sleep_polite(0.6, 1.4)
-    resp = _requests_get(url)
-    soup = BeautifulSoup(resp.text, "html.parser")
-    items = soup.select("li.s-item")[:max_scan]
+    if threshold <= 0:
+        reference = asin = None
+    return _fetch_parsed(url, "sold", CACHE_TTL_SOLD, use_cache, flight, "parse_ebay_sold", parse_ebay_sold_count,
+                         max_scan, reference, asin, threshold)
+
+@_timed("parse_ebay_sold")
+def parse_ebay_sold_count(html: str, max_scan: int = 20, reference: Optional[str] = None,
+                          asin: Optional[str] = None, threshold: float = MATCH_THRESHOLD) -> int:
+    """
+    Sum of the "N sold" badges over the first max_scan listings of an eBay sold/completed page; with
+    a reference title, over the first max_scan listings matching it (see parse_ebay_best_price).
+    """
+    soup = make_soup(html, ONLY_EBAY_ITEMS)
+    items = soup.select("li.s-item")[:MATCH_SCAN_RESULTS if reference and threshold > 0 else max_scan]
+    if reference and threshold > 0:
+        keep, _ = _matching([_listing_title(it) for it in items], reference, asin, threshold)
+        items = [items[i] for i in keep]
     total_sold = 0
-    for it in items:
+    for it in items[:max_scan]:
         sold_el = None
         for sel in ["span.s-item__hotness", "span.BOLD", "span.s-item__quantitySold", "span[aria-label*='sold']"]:
             sold_el = it.select_one(sel)
@@ -407,7 +1981,113 @@ def estimate_profit(amazon_price: Optional[float], ebay_price: Optional[float],
     margin = profit / ebay_total_price if ebay_total_price else None
     return ebay_total_price, fee, profit if margin is not None else (None, None, None)
 
-def find_opportunities(categories: List[str],
+@dataclass
+class _LookupPlan:
+    """Per-run eBay lookup settings plus the filter thresholds that decide which fetches can be skipped."""
+    max_results: int
+    use_cache: bool
+    flight: Optional[SingleFlight]
+    min_profit: float
+    min_margin: float
+    min_sold_recent: int
+    fee_rate: float
+    fixed_fee: float
+    enrich_all: bool = False
+    history: Optional[PriceHistory] = None
+    scan_id: Optional[int] = None
+    incremental: bool = False
+    fresh_for: float = HISTORY_FRESH_FOR
+    match_threshold: float = MATCH_THRESHOLD
+
+    @property
+    def price_settings(self) -> str:
+        """Lookup settings a stored best price depends on (history reuse requires them to match)."""
+        return f"results={self.max_results};match={self.match_threshold:g}"
+
+    @property
+    def sold_settings(self) -> str:
+        return f"match={self.match_threshold:g}"
+
+    @property
+    def sold_first(self) -> bool:
+        # the demand filter is the only real threshold -> let it prune the price fetch instead
+        return self.min_sold_recent > 0 and self.min_profit <= 0 and self.min_margin <= 0
+
+    @property
+    def unreachable(self) -> bool:
+        # margin = 1 - fee_rate - (amazon + fixed) / total <= 1 - fee_rate, whatever eBay says
+        return self.min_margin > 1 - self.fee_rate + 1e-9
+
+    def passes_price(self, p: AmazonProduct, best: Optional[EbayResult]) -> bool:
+        ebay_price = best.price_gbp if best else None
+        ebay_ship = best.shipping_gbp if best else 0.0
+        ebay_total, _, profit = estimate_profit(p.price_gbp, ebay_price, ebay_ship, self.fee_rate, self.fixed_fee)
+        margin = (profit / ebay_total) if (profit is not None and ebay_total) else None
+        return profit is not None and margin is not None and profit >= self.min_profit and margin >= self.min_margin
+
+@dataclass
+class _LookupResult:
+    best: Optional[EbayResult]
+    sold_recent: Optional[int]  # None when never fetched
+    price_checked: bool         # False when the price fetch was skipped
+    pruned: int = 0             # fetches skipped because the item already failed a filter
+    reused: int = 0             # fetches answered from the price history
+
+def _ebay_lookup(p: AmazonProduct, query: str, plan: _LookupPlan) -> _LookupResult:
+    """
+    eBay signals for one product. Cheap checks run first and the second fetch is skipped when the first signal already fails
+    the filters (sold_recent is None when it was never fetched); plan.enrich_all always fetches both.
+    On incremental scans, signals still fresh in the price history (and fetched with the same max
+    results and match threshold) are reused instead of fetched; whatever is fetched is recorded there.
+    """
+    known = plan.history.known(p.asin, query, p.price_gbp, plan.fresh_for, price_settings=plan.price_settings,
+                               sold_settings=plan.sold_settings) \
+        if plan.incremental and plan.history is not None else None
+    fetched, reused = {}, []
+
+    def price():
+        if known is not None and known.price_checked:
+            reused.append("price")
+            return known.best
+        fetched["price"] = scrape_ebay_best_price(query, max_results=plan.max_results, use_cache=plan.use_cache,
+                                                  flight=plan.flight, reference=p.title, asin=p.asin,
+                                                  threshold=plan.match_threshold)
+        return fetched["price"]
+
+    def sold():
+        if known is not None and known.sold_recent is not None:
+            reused.append("sold")
+            return known.sold_recent
+        fetched["sold"] = ebay_sold_count_html(query, max_scan=20, use_cache=plan.use_cache, flight=plan.flight,
+                                               reference=p.title, asin=p.asin, threshold=plan.match_threshold)
+        return fetched["sold"]
+
+    best, sold_recent, pruned = _pruned_lookup(p, plan, price, sold)
+    for signal in reused:
+        _count("history_reused", signal=signal)
+    if plan.history is not None and fetched:
+        plan.history.record(p.asin, query, p.price_gbp, plan.scan_id, best=fetched.get("price"),
+                            price_checked="price" in fetched, sold_recent=fetched.get("sold"),
+                            price_settings=plan.price_settings, sold_settings=plan.sold_settings)
+    return _LookupResult(best, sold_recent, "price" in fetched or "price" in reused, pruned, len(reused))
+
+def _pruned_lookup(p: AmazonProduct, plan: _LookupPlan, price, sold):
+    """Ordering/pruning of the two eBay signals: (best, sold_recent, fetches pruned)."""
+    if plan.enrich_all:
+        return price(), sold(), 0
+    if plan.unreachable:
+        return None, None, 2
+    if plan.sold_first:
+        sold_recent = sold()
+        if sold_recent < plan.min_sold_recent:
+            return None, sold_recent, 1
+        return price(), sold_recent, 0
+    best = price()
+    if not plan.passes_price(p, best):
+        return best, None, 1
+    return best, sold(), 0
+
+def iter_opportunities(categories: List[str],
                        min_profit: float = 3.0,
                        min_margin: float = 0.12,
                        min_sold_recent: int = 10,
@@ -416,42 +2096,192 @@ def find_opportunities(categories: List[str],
                        max_items: int = 50,
                        max_ebay_results: int = 8,
                        avoid_keywords: List[str] = None,
-                       query_words: int = 8):
+                       query_words: int = 8,
+                       concurrency: int = EBAY_CONCURRENCY,
+                       use_cache: bool = True,
+                       enrich_all: bool = False,
+                       metrics: Optional[ScanMetrics] = None,
+                       incremental: bool = False,
+                       fresh_for: float = HISTORY_FRESH_FOR,
+                       history: Optional[PriceHistory] = None,
+                       product_slice: Optional[Tuple[int, int]] = None,
+                       match_threshold: float = MATCH_THRESHOLD,
+                       record_scan: bool = True,
+                       keep_candidates: bool = True,
+                       category_products: Optional[Dict[str, List[AmazonProduct]]] = None) -> Iterator[ScanEvent]:
+    """
+    Streaming scan: yields ScanEvents as work completes ("category_start", "product", "row",
+    "category_done", then a final "done" carrying a ScanSummary and the run's ScanMetrics).
+    Rows come out in scan order, unsorted.
+    An ASIN seen in several categories is looked up once; its row's category_urls lists them all
+    (appearances in later categories are appended to the already-yielded row). Identical eBay
+    queries within the run share one fetch.
+    concurrency > 1 keeps that many eBay lookups in flight (politeness delays and the
+    per-host cap still apply); the rows are identical to the serial path.
+    use_cache=False bypasses cached eBay pages (fresh fetches still refresh the cache).
+    eBay signals are fetched lazily: whichever of price/sold is fetched first, the other is skipped
+    when the item already fails the thresholds (counted in ScanSummary.fetches_pruned).
+    enrich_all=True fetches both for every product.
+    eBay listings only count (for the best price and the sold count) when their title matches the
+    Amazon product with a title_match_scores of at least match_threshold (0 turns matching off).
+    Profit, fees, margin and the thresholds are computed vectorized over a CandidateBatch of all
+    looked-up products (in chunks, whenever the next lookup isn't ready yet); the "done" event
+    carries that batch, unfiltered, for re-filtering without refetching.
+    Every fetched eBay signal and the run's rows go to the price history (history, or the
+    process-wide price_history() when None); the "done" event carries a ScanDelta against the
+    previous complete scan of the same categories. incremental=True reuses stored signals younger
+    than fresh_for seconds for products whose Amazon price hasn't moved (new ASINs, changed prices
+    and stale entries are fetched again).
+    product_slice=(start, stop) keeps only that slice of each category's Best Seller list (page
+    order, before avoid-keyword filtering), so one category's eBay work can be split across shards.
+    category_products maps category URLs to Best Seller lists already loaded (e.g. one snapshot that
+    every slice of the category cuts from); those categories aren't loaded again.
+    record_scan=False still records and reuses eBay signals but stores no scan (rows, delta), for
+    partial scans such as shards that must not become the baseline of the next delta report.
+    keep_candidates=False drops each category's candidates once it is done ("done" then carries
+    candidates=None), for long streaming runs; rows are then only held for the history scan, if any.
+    Closing the generator early cancels outstanding fetches.
+    """
     if avoid_keywords is None:
         avoid_keywords = ["Apple iPhone","Nike","PlayStation","Xbox","Gift Card"]
-    rows: List[OpportunityRow] = []
-    for cat in categories:
-        products = scrape_amazon_bestsellers(cat, max_items=max_items)
-        for p in products:
-            if any(k.lower() in p.title.lower() for k in avoid_keywords):
-                continue
-            query = " ".join(p.title.split()[:query_words])
-            best = scrape_ebay_best_price(query, max_results=max_ebay_results)
-            ebay_price = best.price_gbp if best else None
-            ebay_ship = best.shipping_gbp if best else 0.0
-            sold_recent = ebay_sold_count_html(query, max_scan=20)
-            ebay_total, fees, profit = estimate_profit(p.price_gbp, ebay_price, ebay_ship, ebay_fee_rate, ebay_fixed_fee)
-            margin = (profit / ebay_total) if (profit is not None and ebay_total) else None
-            if (profit is not None and margin is not None
-                and sold_recent >= min_sold_recent and profit >= min_profit and margin >= min_margin):
-                rows.append(OpportunityRow(
-                    title=p.title,
-                    amazon_price=p.price_gbp,
-                    ebay_price=ebay_price,
-                    ebay_shipping=ebay_ship,
-                    ebay_total_price=ebay_total,
-                    estimated_ebay_fee=fees,
-                    est_profit_gbp=profit,
-                    est_margin=margin,
-                    prime=p.prime,
-                    rating=p.rating,
-                    reviews=p.reviews_count,
-                    amazon_url=p.url,
-                    ebay_url=best.url if best else "",
-                    asin=p.asin,
-                    category_url=p.category_url,
-                    image_url=p.image_url,
-                    sold_recent=sold_recent
-                ))
+    metrics = metrics if metrics is not None else ScanMetrics()
+    n_cats, found = len(categories), 0
+    summary = ScanSummary(categories=n_cats)
+    flight = SingleFlight()
+    plan = _LookupPlan(max_ebay_results, use_cache, flight, min_profit, min_margin, min_sold_recent,
+                       ebay_fee_rate, ebay_fixed_fee, enrich_all)
+    history = history if history is not None else price_history()
+    if history is not None and record_scan:
+        summary.scan_id = history.start_scan(categories, dict(
+            min_profit=min_profit, min_margin=min_margin, min_sold_recent=min_sold_recent, ebay_fee_rate=ebay_fee_rate,
+            ebay_fixed_fee=ebay_fixed_fee, max_items=max_items, query_words=query_words, incremental=incremental,
+            match_threshold=match_threshold))
+    plan.history, plan.scan_id, plan.incremental, plan.fresh_for = history, summary.scan_id, incremental, fresh_for
+    plan.match_threshold = match_threshold
+    rows_out: List[OpportunityRow] = []
+    batch = CandidateBatch()
+    complete = False
+    asin_categories: Dict[str, List[str]] = {}
+
+    def flush(waiting: List[Tuple[int, int]], cat: str, ci: int, n_prod: int) -> List[ScanEvent]:
+        """Vectorized profit/filter pass over the looked-up but unevaluated batch rows; their row/product events."""
+        nonlocal found
+        if not waiting:
+            return []
+        t0 = time.perf_counter()
+        start = waiting[0][0]
+        ev = batch.evaluate(min_profit, min_margin, min_sold_recent, ebay_fee_rate, ebay_fixed_fee, start)
+        passing = np.flatnonzero(ev["mask"]) + start
+        rows = dict(zip(passing.tolist(), batch.rows(passing, ev, start)))
+        events = []
+        for idx, pi in waiting:
+            row = rows.get(idx)
+            if row:
+                found += 1
+                if summary.scan_id is not None:
+                    rows_out.append(row)
+                metrics.inc("rows")
+                events.append(ScanEvent("row", cat, ci, n_cats, pi + 1, n_prod, row=row, rows_found=found))
+            events.append(ScanEvent("product", cat, ci, n_cats, pi + 1, n_prod, rows_found=found))
+        waiting.clear()
+        metrics.observe("pipeline", time.perf_counter() - t0)
+        return events
+
+    scrape = _with_metrics(scrape_amazon_bestsellers, metrics)
+    lookup = _with_metrics(_ebay_lookup, metrics)
+    loaded = category_products or {}
+    load = lambda cat: list(loaded[cat]) if cat in loaded else scrape(cat, max_items)
+    # categories load in the background (bounded by the browser's page pool) while eBay lookups run
+    amazon_pool = ThreadPoolExecutor(max_workers=max(1, PLAYWRIGHT_PAGES))
+    pool = ThreadPoolExecutor(max_workers=concurrency) if concurrency > 1 else None
+    try:
+        pending = [amazon_pool.submit(load, cat) for cat in categories]
+        for ci, (cat, fut) in enumerate(zip(categories, pending)):
+            t0 = time.perf_counter()
+            products = fut.result()
+            metrics.observe("wait_amazon", time.perf_counter() - t0)
+            t0 = time.perf_counter()
+            if product_slice is not None:
+                products = products[product_slice[0]:product_slice[1]]
+            products = [p for p in products if not any(k.lower() in p.title.lower() for k in avoid_keywords)]
+            unique = []
+            for p in products:
+                if p.asin and p.asin in asin_categories:
+                    if cat not in asin_categories[p.asin]:
+                        asin_categories[p.asin].append(cat)
+                    summary.duplicate_asins += 1
+                    continue
+                if p.asin:
+                    asin_categories[p.asin] = [cat]
+                unique.append(p)
+            products = unique
+            n_prod = len(products)
+            summary.products += n_prod
+            queries = [" ".join(p.title.split()[:query_words]) for p in products]
+            metrics.observe("pipeline", time.perf_counter() - t0)
+            yield ScanEvent("category_start", cat, ci, n_cats, 0, n_prod, rows_found=found)
+            inflight = [pool.submit(lookup, p, q, plan) for p, q in zip(products, queries)] if pool is not None else []
+            waiting: List[Tuple[int, int]] = []  # (batch index, product index) not yet evaluated
+            for pi, p in enumerate(products):
+                if inflight and waiting and not inflight[pi].done():
+                    yield from flush(waiting, cat, ci, n_prod)  # evaluate what we have before blocking
+                t0 = time.perf_counter()
+                res = inflight[pi].result() if inflight else lookup(p, queries[pi], plan)
+                metrics.observe("wait_ebay", time.perf_counter() - t0)
+                summary.fetches_pruned += res.pruned
+                summary.history_reused += res.reused
+                idx = batch.append(p, res.best, res.sold_recent, res.price_checked,
+                                   asin_categories.get(p.asin) or [p.category_url])
+                metrics.inc("items_processed")
+                waiting.append((idx, pi))
+                if not inflight:
+                    yield from flush(waiting, cat, ci, n_prod)
+            yield from flush(waiting, cat, ci, n_prod)
+            inflight = []
+            if not keep_candidates:
+                batch = CandidateBatch()
+            yield ScanEvent("category_done", cat, ci, n_cats, n_prod, n_prod, rows_found=found)
+        complete = True
+    finally:
+        # stopped mid-category: drop the lookups that haven't started instead of waiting for them
+        # (the few already running finish in the background)
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+        amazon_pool.shutdown(wait=False, cancel_futures=True)
+        if summary.scan_id is not None:
+            history.finish_scan(summary.scan_id, rows_out, complete)
+    summary.coalesced_requests, summary.rows = flight.shared, found
+    metrics.inc("fetches_pruned", summary.fetches_pruned)
+    metrics.inc("duplicate_asins", summary.duplicate_asins)
+    delta = history.delta(summary.scan_id) if summary.scan_id is not None else None
+    yield ScanEvent("done", category_total=n_cats, rows_found=found, summary=summary, metrics=metrics, delta=delta,
+                    candidates=batch if keep_candidates else None)
+
+def sort_opportunities(rows: List[OpportunityRow]) -> List[OpportunityRow]:
     rows.sort(key=lambda r: (r.est_profit_gbp or -9e9, r.sold_recent), reverse=True)
     return rows
+
+def find_opportunities(categories: List[str], *args, **kwargs) -> List[OpportunityRow]:
+    """
+    Scan categories and return filtered opportunities, best profit first.
+    Takes the same arguments as iter_opportunities.
+    """
+    return run_scan(categories, *args, **kwargs).rows
+
+@dataclass
+class ScanResult:
+    rows: List[OpportunityRow]
+    summary: ScanSummary
+    metrics: ScanMetrics
+    delta: Optional[ScanDelta] = None
+    candidates: Optional[CandidateBatch] = None  # every looked-up product, unfiltered
+
+def run_scan(categories: List[str], *args, **kwargs) -> ScanResult:
+    """Like find_opportunities, but also returns the run's ScanSummary, ScanMetrics, ScanDelta and CandidateBatch."""
+    rows, done = [], None
+    for ev in iter_opportunities(categories, *args, **kwargs):
+        if ev.kind == "row":
+            rows.append(ev.row)
+        elif ev.kind == "done":
+            done = ev
+    return ScanResult(sort_opportunities(rows), done.summary, done.metrics, done.delta, done.candidates)
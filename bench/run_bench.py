@@ -0,0 +1,223 @@
+"""
+bench/run_bench.py — offline throughput/parse benchmark for arbitrage_core.
+
+Starts the local stand-in (bench/stand_in.py), points the scraper at it and runs a full
+scan (arbitrage_core.run_scan) plus a parser micro-benchmark over the generated fixture pages
+(see bench/stand_in.py). Reports items/sec, p50/p95 per stage (from the scan's ScanMetrics) and
+parse CPU time; --json writes the same numbers plus the raw metrics for run-to-run comparison.
+
+  python -m bench.run_bench --categories 4 --max-items 50 --concurrency 4 --latency-ms 60 --error-rate 0.03
+
+The adaptive per-host rate limit is lifted unless --polite is given (it would dominate the numbers),
+and the response cache is disabled so every page is fetched. The price history is off unless
+--incremental is given, which runs the scan twice against a throwaway history (full, then incremental)
+to show what a rescan costs. The parse-scaling section pushes the fixtures through process pools
+of 1, 2, 4... workers (up to the core count) to show parsing throughput per core. --retry-after makes the stand-in send
+Retry-After with its 429s, to exercise the limiter's throttle handling.
+"""
+
+import argparse, json, os, sys, tempfile, time
+
+CATEGORY_NAMES = ["electronics", "kitchen", "computers", "garden", "sports", "toys", "health", "beauty",
+                  "diy", "automotive", "books", "music"]
+
+def _parse_args(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--categories", type=int, default=4)
+    ap.add_argument("--max-items", type=int, default=50)
+    ap.add_argument("--max-ebay-results", type=int, default=8)
+    ap.add_argument("--concurrency", type=int, default=4)
+    ap.add_argument("--min-profit", type=float, default=0.0)
+    ap.add_argument("--min-margin", type=float, default=0.0)
+    ap.add_argument("--min-sold", type=int, default=0)
+    ap.add_argument("--enrich-all", action="store_true")
+    ap.add_argument("--latency-ms", type=float, default=50.0)
+    ap.add_argument("--jitter-ms", type=float, default=30.0)
+    ap.add_argument("--error-rate", type=float, default=0.0)
+    ap.add_argument("--error-codes", default="429,503,403")
+    ap.add_argument("--parse-reps", type=int, default=5, help="repetitions per fixture in the parse benchmark")
+    ap.add_argument("--skip-scan", action="store_true", help="only run the parser benchmark")
+    ap.add_argument("--incremental", action="store_true", help="follow the scan with an incremental rescan")
+    ap.add_argument("--match-threshold", default=None, help="eBay title match threshold (SCRAPER_MATCH_THRESHOLD); keep 0 (off) for"
+                    " throughput runs, the stand-in's eBay pages don't list the Amazon products")
+    ap.add_argument("--parse-workers", default=None, help="parse processes for the scan (SCRAPER_PARSE_WORKERS)")
+    ap.add_argument("--retry-after", type=float, default=None, help="Retry-After seconds sent with 429s")
+    ap.add_argument("--polite", action="store_true", help="keep the configured per-host rate limits")
+    ap.add_argument("--json", dest="json_path", default=None)
+    return ap.parse_args(argv)
+
+def _configure_env(args):
+    """Must run before arbitrage_core is imported: its settings are read at import time."""
+    os.environ["SCRAPER_CACHE"] = "0"
+    os.environ["SCRAPER_HISTORY"] = "0"
+    if args.match_threshold is not None:
+        os.environ["SCRAPER_MATCH_THRESHOLD"] = args.match_threshold
+    if args.parse_workers is not None:
+        os.environ["SCRAPER_PARSE_WORKERS"] = args.parse_workers
+    os.environ.setdefault("SCRAPER_BACKOFF_BASE", "0.05")
+    if not args.polite:
+        os.environ["SCRAPER_RATE_INITIAL"] = os.environ["SCRAPER_RATE_MAX"] = "1000"
+        os.environ["SCRAPER_RATE_BURST"] = "50"
+
+def run_scan(core, base_url: str, args, history=None, incremental: bool = False) -> dict:
+    categories = [f"{base_url}/gp/bestsellers/{name}" for name in (CATEGORY_NAMES * 4)[:args.categories]]
+    t0, cpu0 = time.perf_counter(), time.process_time()
+    result = core.run_scan(categories, min_profit=args.min_profit, min_margin=args.min_margin,
+                           min_sold_recent=args.min_sold, max_items=args.max_items,
+                           max_ebay_results=args.max_ebay_results, concurrency=args.concurrency,
+                           enrich_all=args.enrich_all, history=history, incremental=incremental)
+    wall, cpu = time.perf_counter() - t0, time.process_time() - cpu0
+    summary, metrics = result.summary, result.metrics
+    items = summary.products + summary.duplicate_asins
+    stages = {}
+    for st in metrics.stages():  # everything hits the one stand-in host, so stage names are unique
+        stages[st["stage"]] = {"calls": st["calls"], "total_s": st["seconds"],
+                               "p50_ms": round(st["p50_s"] * 1000, 2), "p95_ms": round(st["p95_s"] * 1000, 2)}
+    return {
+        "wall_s": round(wall, 3),
+        "cpu_s": round(cpu, 3),
+        "items": items,
+        "items_per_s": round(items / wall, 2) if wall else 0.0,
+        "rows": len(result.rows),
+        "summary": summary.to_dict(),
+        "stages": stages,
+        "metrics": metrics.to_dict(),
+        "rate_limits": core.rate_limiter_snapshot(),
+        "parse_workers": core.PARSE_WORKERS,
+        "match_threshold": core.MATCH_THRESHOLD,
+        "http_requests": int(sum(c["value"] for c in metrics.counters() if c["name"] == "requests")),
+        "delta": {k: len(getattr(result.delta, k)) for k in ("new", "dropped", "moved")} if result.delta else None,
+    }
+
+def _fixture_pages() -> dict:
+    from bench.stand_in import FIXTURES
+    return {name: open(os.path.join(FIXTURES, name), encoding="utf-8").read()
+            for name in sorted(os.listdir(FIXTURES)) if name.endswith(".html") and "root" not in name}
+
+def _parse_jobs(core, pages: dict) -> list:
+    """(fn, args) per fixture page, as the scan's fetchers hand them to the parse stage."""
+    jobs = []
+    for name, html in pages.items():
+        if name.startswith("amazon_bestsellers"):
+            jobs.append((core.parse_bestseller_page, (html, "bench")))
+        elif name.startswith("ebay_search"):
+            jobs.append((core.parse_ebay_best_price, (html, 60, "bench")))
+        elif name.startswith("ebay_sold"):
+            jobs.append((core.parse_ebay_sold_count, (html, 60)))
+    return jobs
+
+def run_parse_scaling(core, reps: int) -> dict:
+    """Pages/s through 4 fetcher-style threads parsing inline (GIL-bound) vs process pools of growing size."""
+    from concurrent.futures import ThreadPoolExecutor
+    jobs = _parse_jobs(core, _fixture_pages()) * max(1, reps)
+    out = {}
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=4) as threads:
+        list(threads.map(lambda job: job[0](*job[1]), jobs))
+    out["threads_inline"] = round(len(jobs) / (time.perf_counter() - t0), 2)
+    cores, n = core._usable_cpus(), 1
+    while n <= max(1, cores):
+        pool = core.new_parse_pool(n)
+        try:
+            list(pool.map(core._run_parse, [len] * n, ["warm-up"] * n))  # pay process start-up outside the timing
+            t0 = time.perf_counter()
+            for fut in [pool.submit(core._run_parse, fn, *args) for fn, args in jobs]:
+                fut.result()
+            out[f"processes_{n}"] = round(len(jobs) / (time.perf_counter() - t0), 2)
+        finally:
+            pool.shutdown()
+        n *= 2
+    return {"pages": len(jobs), "cores": cores, "pages_per_s": out}
+
+def run_parse_bench(core, reps: int) -> dict:
+    """CPU time per page for each parser backend, with and without strained parsing; checks the outputs agree."""
+    pages = _fixture_pages()
+    parsers = {
+        "amazon_cards": (lambda html: core.parse_bestseller_page(html, "bench"), "amazon_bestsellers"),
+        "ebay_best_price": (lambda html: core.parse_ebay_best_price(html, 60, "bench"), "ebay_search"),
+        "ebay_sold_count": (lambda html: core.parse_ebay_sold_count(html, 60), "ebay_sold"),
+    }
+    backends = ["html.parser"]
+    try:
+        import lxml  # noqa: F401
+        backends.append("lxml")
+    except ImportError:
+        pass
+    saved = core.PARSER_BACKEND, core.HTML_PARSE_ONLY
+    results, outputs = {}, {}
+    try:
+        for backend in backends:
+            for strained in (False, True):
+                core.PARSER_BACKEND, core.HTML_PARSE_ONLY = backend, strained
+                variant = f"{backend}{'+strained' if strained else ''}"
+                for pname, (fn, prefix) in parsers.items():
+                    docs = [html for name, html in pages.items() if name.startswith(prefix)]
+                    cpu0 = time.process_time()
+                    for _ in range(reps):
+                        out = [fn(html) for html in docs]
+                    per_page = (time.process_time() - cpu0) / (reps * len(docs))
+                    results.setdefault(pname, {})[variant] = round(per_page * 1000, 3)
+                    outputs.setdefault(pname, {})[variant] = out
+    finally:
+        core.PARSER_BACKEND, core.HTML_PARSE_ONLY = saved
+    parity = {pname: all(o == next(iter(v.values())) for o in v.values()) for pname, v in outputs.items()}
+    return {"cpu_ms_per_page": results, "identical_across_backends": parity}
+
+def _print_report(report: dict):
+    if "scan" in report:
+        scan = report["scan"]
+        print(f"scan: {scan['items']} items in {scan['wall_s']}s -> {scan['items_per_s']} items/s "
+              f"(cpu {scan['cpu_s']}s, {scan['rows']} rows, {scan['http_requests']} HTTP requests)")
+        print(f"  summary: {scan['summary']}")
+        print(f"  {'stage':<18}{'calls':>7}{'total s':>10}{'p50 ms':>10}{'p95 ms':>10}")
+        for stage, st in scan["stages"].items():
+            print(f"  {stage:<18}{st['calls']:>7}{st['total_s']:>10}{st['p50_ms']:>10}{st['p95_ms']:>10}")
+        print(f"  rate limits: {scan['rate_limits']}")
+        print(f"  stand-in: {report['server']}")
+    if "rescan" in report:
+        rescan = report["rescan"]
+        print(f"incremental rescan: {rescan['wall_s']}s, {rescan['http_requests']} HTTP requests, "
+              f"{rescan['summary']['history_reused']} eBay fetches reused, {rescan['rows']} rows, delta {rescan['delta']}")
+    parse = report["parse"]
+    print("parse cpu ms/page:")
+    for pname, variants in parse["cpu_ms_per_page"].items():
+        cells = ", ".join(f"{v}={ms}" for v, ms in variants.items())
+        print(f"  {pname:<16} {cells}  identical={parse['identical_across_backends'][pname]}")
+    scaling = report["parse_scaling"]
+    cells = ", ".join(f"{k}={v}" for k, v in scaling["pages_per_s"].items())
+    print(f"parse scaling ({scaling['pages']} pages, {scaling['cores']} cores), pages/s: {cells}")
+
+def main(argv=None):
+    args = _parse_args(argv)
+    _configure_env(args)
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    import arbitrage_core as core
+    from bench.stand_in import StandIn
+
+    report = {"args": vars(args)}
+    if not args.skip_scan:
+        server = StandIn(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate,
+                         error_codes=[int(c) for c in args.error_codes.split(",") if c.strip()],
+                         retry_after=args.retry_after)
+        base_url = server.start()
+        core.EBAY_SEARCH_URL = f"{base_url}/sch/i.html"
+        try:
+            if args.incremental:
+                with tempfile.TemporaryDirectory() as tmp:
+                    history = core.PriceHistory(os.path.join(tmp, "history.sqlite3"))
+                    report["scan"] = run_scan(core, base_url, args, history)
+                    report["rescan"] = run_scan(core, base_url, args, history, incremental=True)
+            else:
+                report["scan"] = run_scan(core, base_url, args)
+        finally:
+            server.stop()
+        report["server"] = dict(server.stats)
+    report["parse"] = run_parse_bench(core, args.parse_reps)
+    report["parse_scaling"] = run_parse_scaling(core, args.parse_reps)
+    _print_report(report)
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(report, f, indent=2, default=str)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""
+bench/stand_in.py — local HTTP stand-in for Amazon Best Seller and eBay search/sold pages.
+
+Serves the pages in bench/fixtures with optional latency and error injection, so the scraper can
+be exercised end to end with no network access.
+
+The fixtures are generated, not captured: they follow the Amazon/eBay markup the parsers read
+(Best Seller cards, eBay result items and their selectors), padded with filler <script> blobs
+("k0":"xxxx...") to a typical page weight, with synthetic "<Brand> ... Model NNNN" titles. Parse
+timings reflect those selectors and that page size, not the DOM depth or text of real pages, and
+title-match scores on them say nothing about real listings.
+
+  /gp/bestsellers                 -> amazon_bestsellers_root.html
+  /gp/bestsellers/<cat>?pg=N      -> amazon_bestsellers_pgN.html (ASINs/models re-keyed per category,
+                                     ~10% of ASINs shared across categories)
+  /sch/i.html?_nkw=...            -> ebay_search_K.html, or ebay_sold_K.html with LH_Sold=1
+                                     (K picked from the query, so results vary per product)
+
+Run standalone:
+  python -m bench.stand_in --port 8800 --latency-ms 80 --jitter-ms 40 --error-rate 0.05 --error-codes 429,503,403
+"""
+
+import argparse, gzip, hashlib, os, random, re, threading, time, urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Sequence
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+EBAY_VARIANTS = 3
+
+_asin_re = re.compile(r"\bB0[0-9A-Z]{8}\b")
+_model_re = re.compile(r"Model (\d+)")
+
+def _digest(*parts: str) -> int:
+    return int(hashlib.md5("|".join(parts).encode()).hexdigest(), 16)
+
+def _rekey(body: str, salt: str) -> str:
+    """Give each category its own products while keeping a slice of ASINs shared between categories."""
+    def asin(m):
+        a = m.group(0)
+        if _digest(a) % 10 == 0:
+            return a
+        return "B0" + format(_digest(salt, a) % 36 ** 8, "X").rjust(8, "0")[-8:]
+    body = _asin_re.sub(asin, body)
+    return _model_re.sub(lambda m: f"Model {_digest(salt, m.group(1)) % 9000 + 1000}", body)
+
+class StandIn:
+    """Threaded stand-in server; start() returns the base URL, stats holds request/error counters."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency_ms: float = 0.0, jitter_ms: float = 0.0,
+                 error_rate: float = 0.0, error_codes: Sequence[int] = (429, 503, 403),
+                 retry_after: Optional[float] = None, compress: bool = True, seed: int = 0):
+        self.latency_ms, self.jitter_ms = latency_ms, jitter_ms
+        self.error_rate, self.error_codes = error_rate, tuple(error_codes)
+        self.retry_after = retry_after
+        self.compress = compress
+        self.stats: Dict[str, int] = {}
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._fixtures = {name: open(os.path.join(FIXTURES, name), encoding="utf-8").read()
+                          for name in os.listdir(FIXTURES) if name.endswith(".html")}
+        self._bodies: Dict[str, bytes] = {}
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> str:
+        self._thread = threading.Thread(target=self._server.serve_forever, name="stand-in", daemon=True)
+        self._thread.start()
+        return self.base_url
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _count(self, key: str):
+        with self._lock:
+            self.stats[key] = self.stats.get(key, 0) + 1
+
+    def _roll(self):
+        """(error status or None, delay seconds) for the next request."""
+        with self._lock:
+            err = self._rng.choice(self.error_codes) if self.error_codes and self._rng.random() < self.error_rate else None
+            delay = (self.latency_ms + self._rng.uniform(0, self.jitter_ms)) / 1000.0
+        return err, delay
+
+    def _page(self, path: str, query: Dict[str, str]) -> Optional[str]:
+        """Fixture body for a request path, or None for 404."""
+        parts = [p for p in path.split("/") if p]
+        if parts[:2] == ["gp", "bestsellers"]:
+            if len(parts) == 2:
+                return self._fixtures["amazon_bestsellers_root.html"]
+            pg = query.get("pg", "1")
+            body = self._fixtures.get(f"amazon_bestsellers_pg{pg}.html")
+            return _rekey(body, parts[2]) if body is not None else "<html><body></body></html>"
+        if path.endswith("/sch/i.html"):
+            kind = "sold" if query.get("LH_Sold") == "1" else "search"
+            return self._fixtures[f"ebay_{kind}_{_digest(query.get('_nkw', '')) % EBAY_VARIANTS}.html"]
+        return None
+
+    def _handler(self):
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, like the real sites
+
+            def do_GET(self):
+                url = urllib.parse.urlsplit(self.path)
+                query = dict(urllib.parse.parse_qsl(url.query))
+                err, delay = stand_in._roll()
+                if delay:
+                    time.sleep(delay)
+                if err:
+                    stand_in._count(f"status_{err}")
+                    headers = {"Retry-After": f"{stand_in.retry_after:g}"} if err == 429 and stand_in.retry_after is not None else {}
+                    return self._send(err, b"throttled", headers)
+                body = stand_in._page(url.path, query)
+                if body is None:
+                    stand_in._count("status_404")
+                    return self._send(404, b"not found")
+                stand_in._count("status_200")
+                data = body.encode("utf-8")
+                headers = {"Content-Type": "text/html; charset=utf-8"}
+                if stand_in.compress and "gzip" in self.headers.get("Accept-Encoding", ""):
+                    key = hashlib.md5(data).hexdigest()
+                    with stand_in._lock:
+                        packed = stand_in._bodies.get(key)
+                    if packed is None:
+                        packed = gzip.compress(data, compresslevel=5)
+                        with stand_in._lock:
+                            stand_in._bodies[key] = packed
+                    data, headers["Content-Encoding"] = packed, "gzip"
+                self._send(200, data, headers)
+
+            def _send(self, status: int, data: bytes, headers: Optional[Dict[str, str]] = None):
+                self.send_response(status)
+                for k, v in (headers or {}).items():
+                    self.send_header(k, v)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+def main():
+    ap = argparse.ArgumentParser(description="Serve generated Amazon/eBay stand-in pages locally.")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8800)
+    ap.add_argument("--latency-ms", type=float, default=0.0)
+    ap.add_argument("--jitter-ms", type=float, default=0.0)
+    ap.add_argument("--error-rate", type=float, default=0.0)
+    ap.add_argument("--error-codes", default="429,503,403")
+    ap.add_argument("--retry-after", type=float, default=None, help="Retry-After seconds sent with 429s")
+    args = ap.parse_args()
+    srv = StandIn(args.host, args.port, args.latency_ms, args.jitter_ms, args.error_rate,
+                  [int(c) for c in args.error_codes.split(",") if c.strip()], args.retry_after)
+    print(f"stand-in serving {FIXTURES} at {srv.base_url}")
+    try:
+        srv._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+"""
+scan_cli.py — headless scans for cron and other scheduled runs.
+
+Takes every sidebar setting as a flag or from a JSON/TOML config file (keys as in scan_worker job
+params, flags win), streams rows to JSONL or Parquet as they are found, and checkpoints after each
+category so an interrupted run can pick up where it stopped:
+
+  python scan_cli.py --discover 8 --min-profit 3 --out rows.jsonl
+  python scan_cli.py --config nightly.toml --out nightly.parquet --resume
+
+JSONL is one OpportunityRow object per line. Parquet output is a directory of part files (one per
+category, written in row groups of --batch-size rows); read it with pyarrow.dataset or
+pandas.read_parquet. The checkpoint lives next to the output as <out>.checkpoint.json. --resume
+continues an unfinished run with the categories and settings it started with; without it, or when
+the checkpoint shows a finished run, the output is started afresh.
+
+A row is written as soon as it is found, so its category_urls only lists the categories scanned up
+to then: a later category that also lists the product is not added to the written row (the app and
+scan_coordinator results do include it). The scan's candidate batch is dropped after each category
+and fetched eBay pages are not kept past their fetch; memory still grows with the rows found (kept
+for the price-history scan), the ASINs seen and, with the response cache off or bypassed, one small
+parsed result per distinct eBay query.
+
+Neither Streamlit nor pandas is imported, and pyarrow only for Parquet output.
+"""
+
+import argparse, json, os, sys, time, typing
+from dataclasses import asdict
+from typing import List, Optional, Set
+
+SCAN_KEYS = ("min_profit", "min_margin", "min_sold_recent", "ebay_fee_rate", "ebay_fixed_fee", "max_items",
+             "max_ebay_results", "avoid_keywords", "query_words", "concurrency", "use_cache", "enrich_all",
+             "incremental", "fresh_for", "match_threshold")
+DEFAULT_AVOID = "Apple iPhone,Nike,PlayStation,Xbox,Gift Card"
+
+def load_config(path: str) -> dict:
+    """Settings from a .json or .toml file (TOML needs Python 3.11+ or the tomli package)."""
+    if path.endswith(".toml"):
+        try:
+            import tomllib
+        except ImportError:  # Python < 3.11
+            import tomli as tomllib
+        with open(path, "rb") as f:
+            return tomllib.load(f)
+    with open(path) as f:
+        return json.load(f)
+
+def _parser() -> argparse.ArgumentParser:
+    ap = argparse.ArgumentParser(description="Headless Amazon -> eBay scan with streaming JSONL/Parquet output.")
+    ap.add_argument("--config", default=None, help="JSON or TOML file with any of the settings below")
+    ap.add_argument("--out", required=True, help="output path (.jsonl, or .parquet for a Parquet directory)")
+    ap.add_argument("--format", choices=("jsonl", "parquet"), default=None, help="default: from --out's extension")
+    ap.add_argument("--resume", action="store_true", help="continue an unfinished run from its checkpoint")
+    ap.add_argument("--batch-size", type=int, default=500, help="Parquet rows per row group")
+    ap.add_argument("--quiet", action="store_true", help="no progress lines on stderr")
+    g = ap.add_argument_group("categories")
+    g.add_argument("--discover", type=int, default=None, help="auto-discover this many Best Seller categories (default 8)")
+    g.add_argument("--category", dest="categories", action="append", default=None, help="category URL (repeatable)")
+    g = ap.add_argument_group("filters and heuristics")
+    g.add_argument("--min-profit", type=float, default=None, help="GBP (default 0)")
+    g.add_argument("--min-margin", type=float, default=None, help="fraction, e.g. 0.12 (default 0)")
+    g.add_argument("--min-sold", dest="min_sold_recent", type=int, default=None, help="eBay sold recently (default 0)")
+    g.add_argument("--fee-rate", dest="ebay_fee_rate", type=float, default=None, help="eBay fee rate (default 0.13)")
+    g.add_argument("--fixed-fee", dest="ebay_fixed_fee", type=float, default=None, help="eBay fixed fee in GBP (default 0.30)")
+    g.add_argument("--max-items", type=int, default=None, help="Amazon items per category (default 30)")
+    g.add_argument("--max-ebay-results", type=int, default=None, help="eBay results to scan (default 8)")
+    g.add_argument("--query-words", type=int, default=None, help="title words in the eBay query (default 8)")
+    g.add_argument("--match-threshold", type=float, default=None,
+                   help="min eBay/Amazon title similarity, 0 = off (default SCRAPER_MATCH_THRESHOLD)")
+    g.add_argument("--avoid", default=None, help=f"comma-separated avoid keywords (default {DEFAULT_AVOID!r})")
+    g = ap.add_argument_group("performance")
+    g.add_argument("--concurrency", type=int, default=None, help="concurrent eBay lookups (default SCRAPER_CONCURRENCY)")
+    g.add_argument("--bypass-cache", action="store_true", default=None, help="ignore the eBay response cache")
+    g.add_argument("--enrich-all", action="store_true", default=None, help="fetch all eBay signals (no pruning)")
+    g.add_argument("--incremental", action="store_true", default=None, help="reuse recent eBay data from the price history")
+    g.add_argument("--fresh-hours", type=float, default=None, help="incremental: reuse eBay data younger than this")
+    g.add_argument("--block-resources", action="store_true", default=None, help="block images/fonts/CSS in the Amazon browser")
+    return ap
+
+def scan_params(args, config: dict) -> dict:
+    """Job-style params (see scan_worker.JobQueue.submit) from flags over config over the app's defaults."""
+    params = dict(min_profit=0.0, min_margin=0.0, min_sold_recent=0, ebay_fee_rate=0.13, ebay_fixed_fee=0.30,
+                  max_items=30, max_ebay_results=8, avoid_keywords=DEFAULT_AVOID, query_words=8,
+                  use_cache=True, enrich_all=False, incremental=False, block_resources=False)
+    unknown = set(config) - set(SCAN_KEYS) - {"categories", "discover", "block_resources", "fresh_hours", "avoid"}
+    if unknown:
+        raise ValueError(f"unknown config keys: {', '.join(sorted(unknown))}")
+    params.update(config)
+    flags = {k: v for k, v in vars(args).items() if v is not None}
+    for key in ("min_profit", "min_margin", "min_sold_recent", "ebay_fee_rate", "ebay_fixed_fee", "max_items",
+                "max_ebay_results", "query_words", "match_threshold", "concurrency", "enrich_all", "incremental", "block_resources",
+                "categories", "discover"):
+        if key in flags:
+            params[key] = flags[key]
+    if "avoid" in params:
+        params["avoid_keywords"] = params.pop("avoid")
+    if "avoid" in flags:
+        params["avoid_keywords"] = flags["avoid"]
+    if isinstance(params["avoid_keywords"], str):
+        params["avoid_keywords"] = [s.strip() for s in params["avoid_keywords"].split(",") if s.strip()]
+    if flags.get("bypass_cache"):
+        params["use_cache"] = False
+    hours = flags.get("fresh_hours", params.pop("fresh_hours", None))
+    if hours is not None:
+        params["fresh_for"] = hours * 3600
+    if "discover" in flags and "categories" not in flags:
+        params.pop("categories", None)
+    if params.get("categories"):
+        params.pop("discover", None)
+    else:
+        params.pop("categories", None)
+        params.setdefault("discover", 8)
+    return params
+
+# ---------------- Output ----------------
+class JsonlSink:
+    """Appends one JSON object per row; a checkpoint is the file's byte length."""
+
+    def __init__(self, path: str, resume_at: Optional[int]):
+        self.path = path
+        self._f = open(path, "r+" if resume_at is not None and os.path.exists(path) else "w")
+        self._f.truncate(resume_at or 0)  # drops rows of the category that was cut off
+        self._f.seek(resume_at or 0)
+
+    def write(self, row: dict):
+        self._f.write(json.dumps(row) + "\n")
+
+    def checkpoint(self):
+        self._f.flush()
+        os.fsync(self._f.fileno())
+        return self._f.tell()
+
+    def close(self):
+        self._f.close()
+
+def _arrow_schema(pa, cls):
+    """Arrow schema for a dataclass of str/int/float/bool fields (Optional allowed) and List[str]."""
+    types = {str: pa.string(), int: pa.int64(), float: pa.float64(), bool: pa.bool_()}
+    cols = []
+    for name, hint in typing.get_type_hints(cls).items():
+        args = [a for a in typing.get_args(hint) if a is not type(None)]
+        if typing.get_origin(hint) is list:
+            cols.append((name, pa.list_(types[args[0]])))
+        else:
+            cols.append((name, types[args[0] if args else hint]))
+    return pa.schema(cols)
+
+class ParquetSink:
+    """Part files in a directory: rows buffer up to batch_size per row group, each checkpoint closes a part."""
+
+    def __init__(self, path: str, resume_at: Optional[int], batch_size: int = 500):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        from arbitrage_core import OpportunityRow
+        self._pa, self._pq = pa, pq
+        self.path, self.batch_size = path, batch_size
+        self.schema = _arrow_schema(pa, OpportunityRow)
+        os.makedirs(path, exist_ok=True)
+        self._part = resume_at or 0
+        for name in os.listdir(path):  # parts after the checkpoint belong to a cut-off category
+            if name.startswith("part-") and int(name[5:10]) >= self._part:
+                os.remove(os.path.join(path, name))
+        self._writer = None
+        self._buf: List[dict] = []
+
+    def write(self, row: dict):
+        self._buf.append(row)
+        if len(self._buf) >= self.batch_size:
+            self._flush()
+
+    def _flush(self):
+        if not self._buf:
+            return
+        if self._writer is None:
+            tmp = os.path.join(self.path, f".part-{self._part:05d}.parquet.tmp")
+            self._writer = self._pq.ParquetWriter(tmp, self.schema)
+        self._writer.write_table(self._pa.Table.from_pylist(self._buf, schema=self.schema))
+        self._buf = []
+
+    def checkpoint(self):
+        self._flush()
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+            os.replace(os.path.join(self.path, f".part-{self._part:05d}.parquet.tmp"),
+                       os.path.join(self.path, f"part-{self._part:05d}.parquet"))
+            self._part += 1
+        return self._part
+
+    def close(self):
+        if self._writer is not None:  # unfinished category: the temporary part is dropped on resume
+            self._writer.close()
+
+# ---------------- Checkpoint ----------------
+def _checkpoint_path(out: str) -> str:
+    return out.rstrip("/" + os.sep) + ".checkpoint.json"
+
+def _save_checkpoint(path: str, state: dict):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
+
+def run(params: dict, out: str, fmt: str, resume: bool = False, batch_size: int = 500, log=None) -> dict:
+    """Scan, streaming rows into out; returns the final checkpoint state (with the run's summary)."""
+    import arbitrage_core as core
+    log = log or (lambda msg: None)
+    ck_path = _checkpoint_path(out)
+    state = None
+    if resume and os.path.exists(ck_path):
+        with open(ck_path) as f:
+            state = json.load(f)
+        if state.get("finished"):
+            state = None
+        elif state["params"] != params or state["format"] != fmt:
+            raise ValueError(f"{ck_path} was written with different settings; run without --resume to start over")
+    if state is None:
+        categories = params.get("categories") or core.discover_best_seller_categories(
+            max_categories=int(params.get("discover", 8)))
+        if not categories:
+            raise ValueError("no categories to scan")
+        state = {"params": params, "format": fmt, "categories": categories, "done": [], "position": None,
+                 "rows": 0, "asins": [], "summaries": [], "started_at": time.time(), "finished": False}
+        _save_checkpoint(ck_path, state)
+    else:
+        log(f"resuming: {len(state['done'])}/{len(state['categories'])} categories done, {state['rows']} rows")
+
+    browser = core.amazon_browser()
+    try:
+        browser.set_resource_blocking(core.ResourceBlockPolicy() if params.get("block_resources") else None)
+        sink = (ParquetSink(out, state["position"], batch_size) if fmt == "parquet"
+                else JsonlSink(out, state["position"]))
+        written: Set[str] = set(state["asins"])  # a resumed run no longer knows ASINs from finished categories
+        pending: List[str] = []
+        todo = [c for c in state["categories"] if c not in state["done"]]
+        events = core.iter_opportunities(todo, keep_candidates=False,
+                                         **{k: v for k, v in params.items() if k in SCAN_KEYS})
+        try:
+            for ev in events:
+                if ev.kind == "row":
+                    key = ev.row.asin or ev.row.amazon_url
+                    if key in written:
+                        continue
+                    written.add(key)
+                    pending.append(key)
+                    sink.write(asdict(ev.row))
+                elif ev.kind == "category_done":
+                    state["position"] = sink.checkpoint()
+                    state["done"].append(ev.category_url)
+                    added = len(pending)
+                    state["rows"] += added
+                    state["asins"] += pending
+                    pending = []
+                    _save_checkpoint(ck_path, state)
+                    log(f"[{len(state['done'])}/{len(state['categories'])}] {ev.category_url}: "
+                        f"{added} rows ({state['rows']} total)")
+                elif ev.kind == "done":
+                    state["summaries"].append(ev.summary.to_dict())
+        finally:
+            events.close()
+            sink.close()
+    finally:
+        browser.close()
+    state["finished"] = True
+    state["finished_at"] = time.time()
+    _save_checkpoint(ck_path, state)
+    return state
+
+def main(argv=None) -> int:
+    ap = _parser()
+    args = ap.parse_args(argv)
+    try:
+        params = scan_params(args, load_config(args.config) if args.config else {})
+    except (OSError, ValueError) as e:
+        ap.error(str(e))
+    fmt = args.format or ("parquet" if args.out.endswith(".parquet") else "jsonl")
+    log = (lambda msg: None) if args.quiet else (lambda msg: print(msg, file=sys.stderr, flush=True))
+    try:
+        state = run(params, args.out, fmt, resume=args.resume, batch_size=args.batch_size, log=log)
+    except ValueError as e:
+        print(f"scan_cli: {e}", file=sys.stderr)
+        return 2
+    summary = state["summaries"][-1] if state["summaries"] else {}
+    print(json.dumps(dict(summary, rows=state["rows"], categories=len(state["categories"]), out=args.out)))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,428 @@
+"""
+scan_coordinator.py — split one large scan into shards that several workers lease and run.
+
+A scan lives in a directory that every worker can reach (local disk for several processes, a
+shared mount for several machines). `plan` partitions the categories (and optionally each
+category's Best Seller list) into shards. Each `work` process leases shards one at a time and runs
+them with its own Playwright session and per-host rate limits. `merge` de-duplicates the rows
+across shards and sorts them.
+
+  python scan_coordinator.py plan  --root scans --discover 30 --max-items 200 --items-per-shard 50
+  python scan_coordinator.py work  --root scans            # on every worker process / node
+  python scan_coordinator.py status --root scans --scan <id>
+  python scan_coordinator.py merge --root scans --scan <id> --out rows.json
+
+Leases are files renamed atomically out of todo/. A worker touches its lease while the shard
+runs; a lease untouched for SCRAPER_LEASE_TTL seconds is reclaimed and the shard retried, up to
+SCRAPER_SHARD_MAX_ATTEMPTS times.
+
+Slice shards of one category cut their slice from a single snapshot of its Best Seller list
+(snapshots/), taken by the first worker that needs it: every product lands in exactly one slice
+however the ranks move during the scan, and the category's Amazon pages are loaded once.
+"""
+
+import argparse, hashlib, json, os, socket, threading, time, uuid
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional, Tuple
+
+import arbitrage_core as core
+from arbitrage_core import AmazonProduct, CandidateBatch, OpportunityRow
+
+LEASE_TTL = float(os.environ.get("SCRAPER_LEASE_TTL", 300.0))
+SHARD_MAX_ATTEMPTS = int(os.environ.get("SCRAPER_SHARD_MAX_ATTEMPTS", 3))
+WORK_POLL = float(os.environ.get("SCRAPER_WORK_POLL", 5.0))
+
+def _write_json(path: str, obj):
+    """Atomic write: readers see the old file or the new one, never a partial one."""
+    tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(obj, f)
+    os.replace(tmp, path)
+
+def _read_json(path: str, default=None):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+@dataclass
+class Shard:
+    shard_id: str
+    categories: List[str]
+    product_slice: Optional[Tuple[int, int]]
+    attempt: int
+
+@dataclass
+class MergedScan:
+    rows: List[OpportunityRow]
+    summary: dict
+    candidates: CandidateBatch
+    failed: Dict[str, str]  # shard id -> last error
+
+class ShardedScan:
+    """
+    One sharded scan under root/<scan_id>: scan.json (scan parameters), shards/<id>.json (shard
+    specs) and one state file per shard in todo/, leases/, done/ or failed/.
+    """
+
+    def __init__(self, root: str, scan_id: str):
+        self.scan_id = scan_id
+        self.path = os.path.join(root, scan_id)
+        spec = _read_json(os.path.join(self.path, "scan.json"), {})
+        self.params: dict = spec.get("params", {})
+        self.categories: List[str] = spec.get("categories", [])
+
+    def _dir(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    @classmethod
+    def create(cls, root: str, categories: List[str], params: dict, categories_per_shard: int = 1,
+               items_per_shard: Optional[int] = None, scan_id: Optional[str] = None) -> "ShardedScan":
+        """
+        Plan a scan: categories are grouped categories_per_shard at a time; with items_per_shard,
+        each category's top max_items products are instead split into slices of that many.
+        params are iter_opportunities keyword arguments.
+        """
+        scan_id = scan_id or time.strftime("%Y%m%d-%H%M%S-") + uuid.uuid4().hex[:6]
+        path = os.path.join(root, scan_id)
+        for name in ("shards", "todo", "leases", "done", "failed", "reclaimed", "snapshots"):
+            os.makedirs(os.path.join(path, name), exist_ok=True)
+        specs: List[dict] = []
+        if items_per_shard:
+            max_items = int(params.get("max_items", 50))
+            for cat in categories:
+                for lo in range(0, max_items, items_per_shard):
+                    specs.append({"categories": [cat], "product_slice": [lo, min(lo + items_per_shard, max_items)]})
+        else:
+            for i in range(0, len(categories), max(1, categories_per_shard)):
+                specs.append({"categories": categories[i:i + categories_per_shard], "product_slice": None})
+        for n, spec in enumerate(specs):
+            shard_id = f"{n:05d}"
+            _write_json(os.path.join(path, "shards", f"{shard_id}.json"), spec)
+            _write_json(os.path.join(path, "todo", shard_id), {"attempt": 0})
+        _write_json(os.path.join(path, "scan.json"), {"params": params, "categories": categories,
+                                                      "shards": len(specs), "created_at": time.time()})
+        return cls(root, scan_id)
+
+    # ---- leasing ----
+    def lease(self, worker_id: str) -> Optional[Shard]:
+        """Take a free shard (renaming its todo file is the lock), or None."""
+        for shard_id in sorted(os.listdir(self._dir("todo"))):
+            if shard_id.endswith(".tmp"):
+                continue
+            lease_path = os.path.join(self._dir("leases"), shard_id)
+            try:
+                os.rename(os.path.join(self._dir("todo"), shard_id), lease_path)
+            except OSError:
+                continue  # another worker got it first
+            attempt = _read_json(lease_path, {}).get("attempt", 0) + 1
+            _write_json(lease_path, {"worker": worker_id, "attempt": attempt, "leased_at": time.time()})
+            spec = _read_json(os.path.join(self._dir("shards"), f"{shard_id}.json"))
+            return Shard(shard_id, spec["categories"],
+                         tuple(spec["product_slice"]) if spec["product_slice"] else None, attempt)
+        return None
+
+    def owns(self, shard: Shard, worker_id: str) -> bool:
+        info = _read_json(os.path.join(self._dir("leases"), shard.shard_id))
+        return bool(info) and info.get("worker") == worker_id and info.get("attempt") == shard.attempt
+
+    def renew(self, shard: Shard, worker_id: str) -> bool:
+        """Extend the lease; False when it has expired and been reclaimed."""
+        if not self.owns(shard, worker_id):
+            return False
+        try:
+            os.utime(os.path.join(self._dir("leases"), shard.shard_id))
+        except OSError:
+            return False
+        return True
+
+    def complete(self, shard: Shard, worker_id: str, result: dict):
+        """Store the shard's result and release the lease (results from a reclaimed lease are still kept)."""
+        _write_json(os.path.join(self._dir("done"), f"{shard.shard_id}.json"),
+                    dict(result, worker=worker_id, attempt=shard.attempt))
+        if self.owns(shard, worker_id):
+            self._release(shard.shard_id)
+        else:
+            self._drop_todo(shard.shard_id)  # reclaimed meanwhile: don't run it again
+
+    def fail(self, shard: Shard, worker_id: str, error: str):
+        """Hand the shard back for another attempt, or mark it failed after SHARD_MAX_ATTEMPTS."""
+        if self.owns(shard, worker_id):
+            self._retry(shard.shard_id, shard.attempt, error)
+
+    def reclaim_expired(self, ttl: float = LEASE_TTL) -> int:
+        """Return shards whose worker stopped renewing its lease to todo/ (or failed/)."""
+        n = 0
+        now = time.time()
+        for shard_id in os.listdir(self._dir("leases")):
+            path = os.path.join(self._dir("leases"), shard_id)
+            try:
+                if now - os.path.getmtime(path) < ttl:
+                    continue
+            except OSError:
+                continue
+            info = _read_json(path, {})
+            if self._retry(shard_id, info.get("attempt", 1), f"lease expired (worker {info.get('worker')})"):
+                n += 1
+        return n
+
+    def _retry(self, shard_id: str, attempt: int, error: str) -> bool:
+        # moving the lease aside under a unique name decides which process handles it
+        grave = os.path.join(self._dir("reclaimed"), f"{shard_id}.{uuid.uuid4().hex}")
+        try:
+            os.rename(os.path.join(self._dir("leases"), shard_id), grave)
+        except OSError:
+            return False
+        if os.path.exists(os.path.join(self._dir("done"), f"{shard_id}.json")):
+            return True
+        if attempt >= SHARD_MAX_ATTEMPTS:
+            _write_json(os.path.join(self._dir("failed"), f"{shard_id}.json"), {"attempt": attempt, "error": error})
+        else:
+            _write_json(os.path.join(self._dir("todo"), shard_id), {"attempt": attempt, "last_error": error})
+        return True
+
+    def _release(self, shard_id: str):
+        try:
+            os.rename(os.path.join(self._dir("leases"), shard_id),
+                      os.path.join(self._dir("reclaimed"), f"{shard_id}.{uuid.uuid4().hex}"))
+        except OSError:
+            pass
+
+    def _drop_todo(self, shard_id: str):
+        try:
+            os.remove(os.path.join(self._dir("todo"), shard_id))
+        except OSError:
+            pass
+
+    # ---- category snapshots ----
+    def category_products(self, category: str) -> List[AmazonProduct]:
+        """
+        The category's Best Seller list as first loaded for this scan. The worker that creates the
+        lock file loads it; others wait for the snapshot (or take over a lock older than LEASE_TTL).
+        """
+        os.makedirs(self._dir("snapshots"), exist_ok=True)
+        path = os.path.join(self._dir("snapshots"), hashlib.sha1(category.encode()).hexdigest()[:16] + ".json")
+        lock = path + ".lock"
+        while True:
+            snap = _read_json(path)
+            if snap is not None:
+                return [AmazonProduct(**p) for p in snap["products"]]
+            try:
+                os.close(os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(lock) > LEASE_TTL:
+                        os.remove(lock)  # its worker died mid-load
+                except OSError:
+                    pass
+                time.sleep(min(1.0, WORK_POLL))
+                continue
+            try:
+                products = core.scrape_amazon_bestsellers(category, int(self.params.get("max_items", 50)))
+                _write_json(path, {"category": category, "loaded_at": time.time(),
+                                   "products": [asdict(p) for p in products]})
+            finally:
+                try:
+                    os.remove(lock)
+                except OSError:
+                    pass
+            return products
+
+    # ---- progress / results ----
+    def status(self) -> Dict[str, int]:
+        count = lambda name: sum(1 for f in os.listdir(self._dir(name)) if not f.endswith(".tmp"))
+        total = _read_json(os.path.join(self.path, "scan.json"), {}).get("shards", 0)
+        done = count("done")
+        return {"shards": total, "todo": count("todo"), "leased": count("leases"), "done": done,
+                "failed": len([f for f in os.listdir(self._dir("failed")) if f.endswith(".json")
+                               and not os.path.exists(os.path.join(self._dir("done"), f))])}
+
+    @property
+    def finished(self) -> bool:
+        st = self.status()
+        return st["done"] + st["failed"] >= st["shards"]
+
+    def merge(self) -> MergedScan:
+        """Rows of every finished shard, de-duplicated by ASIN (category_urls combined) and sorted."""
+        rows: Dict[str, OpportunityRow] = {}
+        cands: Dict[str, list] = {}
+        seen: Dict[str, int] = {}
+        summary: Dict[str, float] = {}
+        for name in sorted(os.listdir(self._dir("done"))):
+            result = _read_json(os.path.join(self._dir("done"), name))
+            if not result:
+                continue
+            for r in result["rows"]:
+                row = OpportunityRow(**r)
+                key = row.asin or row.amazon_url
+                if key in rows:
+                    urls = rows[key].category_urls
+                    urls.extend(u for u in row.category_urls if u not in urls)
+                else:
+                    rows[key] = row
+            batch = result.get("candidates") or {}
+            for i in range(len(batch.get("title", []))):
+                key = batch["asin"][i] or batch["amazon_url"][i]
+                if key in seen:
+                    urls = cands["category_urls"][seen[key]]
+                    urls.extend(u for u in batch["category_urls"][i] if u not in urls)
+                    continue
+                seen[key] = len(seen)
+                for col, values in batch.items():
+                    cands.setdefault(col, []).append(values[i])
+            for k, v in (result.get("summary") or {}).items():
+                if isinstance(v, (int, float)) and not isinstance(v, bool) and k != "scan_id":
+                    summary[k] = summary.get(k, 0) + v
+        for i, key in enumerate(seen):  # a listing duplicated in another shard still names its category
+            if key in rows:
+                urls = rows[key].category_urls
+                urls.extend(u for u in cands["category_urls"][i] if u not in urls)
+        cross_shard = int(summary.get("products", 0)) - len(seen)
+        if cands:
+            summary.update(products=len(seen), duplicate_asins=summary.get("duplicate_asins", 0) + cross_shard,
+                           cross_shard_duplicates=cross_shard)
+        # every shard fetched its own copy of a cross-shard duplicate, so those saved nothing
+        summary["requests_saved"] = (2 * (summary.get("duplicate_asins", 0) - summary.get("cross_shard_duplicates", 0))
+                                     + summary.get("coalesced_requests", 0) + summary.get("history_reused", 0))
+        failed = {name[:-5]: (_read_json(os.path.join(self._dir("failed"), name)) or {}).get("error", "")
+                  for name in os.listdir(self._dir("failed"))
+                  if name.endswith(".json") and not os.path.exists(os.path.join(self._dir("done"), name))}
+        merged_rows = core.sort_opportunities(list(rows.values()))
+        summary.update(categories=len(self.categories), rows=len(merged_rows), shards=self.status()["shards"], shards_failed=len(failed))
+        candidates = CandidateBatch.from_dict(cands) if cands else CandidateBatch()
+        return MergedScan(merged_rows, summary, candidates, failed)
+
+def list_scans(root: str) -> List[str]:
+    if not os.path.isdir(root):
+        return []
+    return sorted(d for d in os.listdir(root) if os.path.exists(os.path.join(root, d, "scan.json")))
+
+# ---------------- Worker ----------------
+def run_shard(scan: ShardedScan, shard: Shard) -> dict:
+    """Run one shard in this process (own browser, own per-host rate limits); its result record."""
+    # a shard is a slice of a scan: its signals go to the price history, but not as a scan of its categories
+    snapshots = {cat: scan.category_products(cat) for cat in shard.categories} if shard.product_slice else None
+    events = core.iter_opportunities(shard.categories, product_slice=shard.product_slice, record_scan=False,
+                                     category_products=snapshots, **scan.params)
+    rows, done = [], None
+    for ev in events:
+        if ev.kind == "row":
+            rows.append(ev.row)
+        elif ev.kind == "done":
+            done = ev
+    return {"rows": [asdict(r) for r in rows],
+            "candidates": done.candidates.to_dict(),
+            "summary": done.summary.to_dict(),
+            "metrics": done.metrics.to_dict(),
+            "finished_at": time.time()}
+
+def work(root: str, scan_id: Optional[str] = None, worker_id: Optional[str] = None, wait: bool = False,
+         ttl: float = LEASE_TTL) -> int:
+    """
+    Lease and run shards (of one scan, or of every scan under root) until none are left; with
+    wait=True keep polling for new work. Returns the number of shards this worker completed.
+    """
+    worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+    completed = 0
+    while True:
+        scans = [ShardedScan(root, s) for s in ([scan_id] if scan_id else list_scans(root))]
+        leased = None
+        for scan in scans:
+            scan.reclaim_expired(ttl)
+            shard = scan.lease(worker_id)
+            if shard is not None:
+                leased = (scan, shard)
+                break
+        if leased is None:
+            if not wait:
+                return completed
+            time.sleep(WORK_POLL)
+            continue
+        scan, shard = leased
+        stop = threading.Event()
+
+        def renew():
+            while not stop.wait(ttl / 3):
+                scan.renew(shard, worker_id)
+
+        threading.Thread(target=renew, name=f"lease-{shard.shard_id}", daemon=True).start()
+        try:
+            result = run_shard(scan, shard)
+        except KeyboardInterrupt:
+            scan.fail(shard, worker_id, "worker interrupted")
+            raise
+        except Exception as e:
+            scan.fail(shard, worker_id, f"{type(e).__name__}: {e}")
+        else:
+            scan.complete(shard, worker_id, result)
+            completed += 1
+        finally:
+            stop.set()
+
+# ---------------- CLI ----------------
+def _threshold_args(ap: argparse.ArgumentParser):
+    ap.add_argument("--min-profit", type=float, default=3.0)
+    ap.add_argument("--min-margin", type=float, default=0.12)
+    ap.add_argument("--min-sold", type=int, default=10)
+    ap.add_argument("--fee-rate", type=float, default=0.13)
+    ap.add_argument("--fixed-fee", type=float, default=0.30)
+    ap.add_argument("--max-items", type=int, default=50)
+    ap.add_argument("--max-ebay-results", type=int, default=8)
+    ap.add_argument("--query-words", type=int, default=8)
+    ap.add_argument("--match-threshold", type=float, default=core.MATCH_THRESHOLD)
+    ap.add_argument("--concurrency", type=int, default=core.EBAY_CONCURRENCY)
+    ap.add_argument("--enrich-all", action="store_true")
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Sharded multi-worker scans over a shared directory.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    plan = sub.add_parser("plan", help="partition a scan into shards")
+    plan.add_argument("--root", required=True)
+    plan.add_argument("--discover", type=int, default=0, help="auto-discover this many Best Seller categories")
+    plan.add_argument("--category", action="append", default=[], help="category URL (repeatable)")
+    plan.add_argument("--categories-per-shard", type=int, default=1)
+    plan.add_argument("--items-per-shard", type=int, default=None, help="split each category's products too")
+    _threshold_args(plan)
+    wk = sub.add_parser("work", help="lease and run shards")
+    wk.add_argument("--root", required=True)
+    wk.add_argument("--scan", default=None)
+    wk.add_argument("--wait", action="store_true", help="keep polling for new shards")
+    stp = sub.add_parser("status", help="shard counts")
+    stp.add_argument("--root", required=True)
+    stp.add_argument("--scan", required=True)
+    mg = sub.add_parser("merge", help="de-duplicate and sort the finished shards' rows")
+    mg.add_argument("--root", required=True)
+    mg.add_argument("--scan", required=True)
+    mg.add_argument("--out", default=None, help="write the merged rows as JSON")
+    args = ap.parse_args(argv)
+    if getattr(args, "scan", None) and args.scan not in list_scans(args.root):
+        ap.error(f"no scan {args.scan!r} under {args.root}")
+
+    if args.cmd == "plan":
+        categories = list(args.category)
+        if args.discover:
+            categories += core.discover_best_seller_categories(max_categories=args.discover)
+        if not categories:
+            ap.error("no categories: pass --category URLs or --discover N")
+        params = dict(min_profit=args.min_profit, min_margin=args.min_margin, min_sold_recent=args.min_sold,
+                      ebay_fee_rate=args.fee_rate, ebay_fixed_fee=args.fixed_fee, max_items=args.max_items,
+                      max_ebay_results=args.max_ebay_results, query_words=args.query_words,
+                      match_threshold=args.match_threshold,
+                      concurrency=args.concurrency, enrich_all=args.enrich_all)
+        scan = ShardedScan.create(args.root, categories, params, args.categories_per_shard, args.items_per_shard)
+        print(scan.scan_id, scan.status())
+    elif args.cmd == "work":
+        print(f"completed {work(args.root, args.scan, wait=args.wait)} shard(s)")
+    elif args.cmd == "status":
+        print(json.dumps(ShardedScan(args.root, args.scan).status()))
+    else:
+        merged = ShardedScan(args.root, args.scan).merge()
+        print(json.dumps(merged.summary))
+        for shard_id, error in merged.failed.items():
+            print(f"shard {shard_id} failed: {error}")
+        if args.out:
+            _write_json(args.out, [asdict(r) for r in merged.rows])
+
+if __name__ == "__main__":
+    main()
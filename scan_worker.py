@@ -0,0 +1,369 @@
+"""
+scan_worker.py — background scan worker and its SQLite job queue.
+
+The Streamlit app only submits jobs and polls them; this process owns the Playwright browser
+and runs scans back-to-back, so a UI rerun or closed tab never loses a scan and concurrent users
+don't fight over the browser. Progress, partial rows, cancellation requests and final results
+(rows, ScanSummary, ScanMetrics, ScanDelta) all live in the queue database.
+
+  python scan_worker.py                  # serve jobs until interrupted
+  python scan_worker.py --once           # run the queued jobs, then exit
+
+A job whose worker stops heartbeating for SCRAPER_JOB_STALE_AFTER seconds is re-queued (up to
+SCRAPER_JOB_MAX_ATTEMPTS runs).
+"""
+
+import argparse, json, os, signal, socket, sqlite3, threading, time
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional
+
+import arbitrage_core as core
+from arbitrage_core import CandidateBatch, OpportunityRow, ScanDelta
+
+JOBS_PATH = os.environ.get("SCRAPER_JOBS_PATH", ".scan_jobs.sqlite3")
+WORKER_POLL = float(os.environ.get("SCRAPER_WORKER_POLL", 1.0))           # idle queue polling (s)
+WORKER_HEARTBEAT = float(os.environ.get("SCRAPER_WORKER_HEARTBEAT", 10.0))
+JOB_STALE_AFTER = float(os.environ.get("SCRAPER_JOB_STALE_AFTER", 120.0))  # silent worker -> job re-queued
+JOB_MAX_ATTEMPTS = int(os.environ.get("SCRAPER_JOB_MAX_ATTEMPTS", 2))
+WORKER_WARM_BROWSER = os.environ.get("SCRAPER_WARM_BROWSER", "1") != "0"  # launch + log in at worker start
+PROGRESS_EVERY = 0.5  # min seconds between progress writes / cancel checks
+
+ACTIVE = ("queued", "running")
+
+@dataclass
+class Job:
+    job_id: int
+    status: str  # queued | running | done | failed | cancelled
+    params: dict
+    submitted_at: float
+    started_at: Optional[float]
+    finished_at: Optional[float]
+    progress: float
+    progress_text: str
+    rows_found: int
+    cancel_requested: bool
+    attempts: int
+    worker: Optional[str]
+    error: Optional[str]
+    summary: Optional[dict]
+    metrics: Optional[dict]
+    delta: Optional[dict]
+
+    @property
+    def active(self) -> bool:
+        return self.status in ACTIVE
+
+def delta_to_dict(delta: Optional[ScanDelta]) -> Optional[dict]:
+    if delta is None:
+        return None
+    return {"scan_id": delta.scan_id, "previous_scan_id": delta.previous_scan_id,
+            "new": [asdict(r) for r in delta.new], "dropped": [asdict(r) for r in delta.dropped],
+            "moved": [[asdict(a), asdict(b)] for a, b in delta.moved]}
+
+def delta_from_dict(data: Optional[dict]) -> Optional[ScanDelta]:
+    if data is None:
+        return None
+    return ScanDelta(data["scan_id"], data["previous_scan_id"],
+                     new=[OpportunityRow(**r) for r in data["new"]],
+                     dropped=[OpportunityRow(**r) for r in data["dropped"]],
+                     moved=[(OpportunityRow(**a), OpportunityRow(**b)) for a, b in data["moved"]])
+
+class JobQueue:
+    """
+    Scan jobs in SQLite (WAL, so the UI can read while the worker writes). Safe to share between
+    processes; claim() is a single conditional UPDATE, so two workers never take the same job.
+    """
+    _JOB_COLS = ("job_id", "status", "params", "submitted_at", "started_at", "finished_at", "progress",
+                 "progress_text", "rows_found", "cancel_requested", "attempts", "worker", "error", "summary",
+                 "metrics", "delta")
+
+    def __init__(self, path: str = JOBS_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " job_id INTEGER PRIMARY KEY AUTOINCREMENT, status TEXT NOT NULL, params TEXT NOT NULL,"
+            " submitted_at REAL NOT NULL, started_at REAL, finished_at REAL, progress REAL NOT NULL DEFAULT 0,"
+            " progress_text TEXT NOT NULL DEFAULT '', rows_found INTEGER NOT NULL DEFAULT 0,"
+            " cancel_requested INTEGER NOT NULL DEFAULT 0, attempts INTEGER NOT NULL DEFAULT 0, worker TEXT,"
+            " error TEXT, summary TEXT, metrics TEXT, delta TEXT);"
+            "CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, job_id);"
+            "CREATE TABLE IF NOT EXISTS job_rows ("
+            " job_id INTEGER NOT NULL, seq INTEGER NOT NULL, row TEXT NOT NULL, PRIMARY KEY (job_id, seq));"
+            "CREATE TABLE IF NOT EXISTS job_candidates (job_id INTEGER PRIMARY KEY, batch TEXT NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS workers ("
+            " worker_id TEXT PRIMARY KEY, heartbeat_at REAL NOT NULL, job_id INTEGER, info TEXT);"
+        )
+        self._conn.commit()
+
+    # ---- client side ----
+    def submit(self, params: dict) -> int:
+        """Queue a scan. params: iter_opportunities keyword arguments plus either "categories" (URLs)
+        or "discover" (number of Best Seller categories to auto-discover), and optionally "block_resources"."""
+        with self._lock:
+            cur = self._conn.execute("INSERT INTO jobs (status, params, submitted_at) VALUES ('queued', ?, ?)",
+                                     (json.dumps(params), time.time()))
+            self._conn.commit()
+            return cur.lastrowid
+
+    def get(self, job_id: int) -> Optional[Job]:
+        with self._lock:
+            row = self._conn.execute(f"SELECT {', '.join(self._JOB_COLS)} FROM jobs WHERE job_id = ?",
+                                     (job_id,)).fetchone()
+        return self._job(row) if row else None
+
+    def jobs(self, limit: int = 20) -> List[Job]:
+        """Most recent jobs first."""
+        with self._lock:
+            rows = self._conn.execute(f"SELECT {', '.join(self._JOB_COLS)} FROM jobs ORDER BY job_id DESC LIMIT ?",
+                                      (limit,)).fetchall()
+        return [self._job(r) for r in rows]
+
+    def rows(self, job_id: int) -> List[OpportunityRow]:
+        """Rows found so far (all of them once the job has finished), in scan order."""
+        with self._lock:
+            rows = self._conn.execute("SELECT row FROM job_rows WHERE job_id = ? ORDER BY seq", (job_id,)).fetchall()
+        return [OpportunityRow(**json.loads(r)) for (r,) in rows]
+
+    def candidates(self, job_id: int) -> Optional[CandidateBatch]:
+        """The finished job's unfiltered candidate set, for re-filtering without rescanning."""
+        with self._lock:
+            row = self._conn.execute("SELECT batch FROM job_candidates WHERE job_id = ?", (job_id,)).fetchone()
+        return CandidateBatch.from_dict(json.loads(row[0])) if row else None
+
+    def cancel(self, job_id: int) -> bool:
+        """Queued jobs are cancelled at once; running ones stop at the worker's next progress check."""
+        with self._lock:
+            cur = self._conn.execute(
+                "UPDATE jobs SET status = 'cancelled', finished_at = ? WHERE job_id = ? AND status = 'queued'",
+                (time.time(), job_id))
+            if not cur.rowcount:
+                cur = self._conn.execute(
+                    "UPDATE jobs SET cancel_requested = 1 WHERE job_id = ? AND status = 'running'", (job_id,))
+            self._conn.commit()
+            return bool(cur.rowcount)
+
+    def workers(self, max_age: float = JOB_STALE_AFTER) -> List[dict]:
+        """Workers that heartbeated within max_age seconds."""
+        with self._lock:
+            rows = self._conn.execute("SELECT worker_id, heartbeat_at, job_id, info FROM workers WHERE heartbeat_at >= ?",
+                                      (time.time() - max_age,)).fetchall()
+        return [{"worker_id": w, "heartbeat_at": hb, "job_id": j, "info": json.loads(info) if info else {}}
+                for w, hb, j, info in rows]
+
+    # ---- worker side ----
+    def heartbeat(self, worker_id: str, job_id: Optional[int] = None, info: Optional[dict] = None):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO workers (worker_id, heartbeat_at, job_id, info) VALUES (?, ?, ?, ?)"
+                " ON CONFLICT(worker_id) DO UPDATE SET heartbeat_at = excluded.heartbeat_at,"
+                " job_id = excluded.job_id, info = COALESCE(excluded.info, workers.info)",
+                (worker_id, time.time(), job_id, json.dumps(info) if info is not None else None))
+            self._conn.commit()
+
+    def retire(self, worker_id: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM workers WHERE worker_id = ?", (worker_id,))
+            self._conn.commit()
+
+    def claim(self, worker_id: str) -> Optional[Job]:
+        """Take the oldest queued job, or None."""
+        while True:
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT job_id FROM jobs WHERE status = 'queued' ORDER BY job_id LIMIT 1").fetchone()
+                if row is None:
+                    return None
+                cur = self._conn.execute(
+                    "UPDATE jobs SET status = 'running', started_at = ?, worker = ?, attempts = attempts + 1,"
+                    " progress = 0, progress_text = '', rows_found = 0 WHERE job_id = ? AND status = 'queued'",
+                    (time.time(), worker_id, row[0]))
+                self._conn.execute("DELETE FROM job_rows WHERE job_id = ?", (row[0],))
+                self._conn.commit()
+            if cur.rowcount:
+                return self.get(row[0])
+
+    def update_progress(self, job_id: int, progress: float, text: str, rows_found: int) -> bool:
+        """Record progress; returns True when cancellation was requested."""
+        with self._lock:
+            self._conn.execute("UPDATE jobs SET progress = ?, progress_text = ?, rows_found = ? WHERE job_id = ?",
+                               (progress, text, rows_found, job_id))
+            self._conn.commit()
+            (cancel,) = self._conn.execute("SELECT cancel_requested FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return bool(cancel)
+
+    def add_row(self, job_id: int, seq: int, row: OpportunityRow):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO job_rows (job_id, seq, row) VALUES (?, ?, ?)",
+                               (job_id, seq, json.dumps(asdict(row))))
+            self._conn.commit()
+
+    def mark_cancelled(self, job_id: int):
+        """Show a running job as cancelled right away; finish() still stores its partial results."""
+        with self._lock:
+            self._conn.execute("UPDATE jobs SET status = 'cancelled', finished_at = ? WHERE job_id = ? AND status = 'running'",
+                               (time.time(), job_id))
+            self._conn.commit()
+
+    def finish(self, job_id: int, status: str, rows: List[OpportunityRow], error: Optional[str] = None,
+               summary: Optional[dict] = None, metrics: Optional[dict] = None, delta: Optional[dict] = None,
+               candidates: Optional[CandidateBatch] = None):
+        """Final state; rows are rewritten since rows can gain category_urls after they were first stored."""
+        with self._lock:
+            self._conn.execute("DELETE FROM job_rows WHERE job_id = ?", (job_id,))
+            self._conn.executemany("INSERT INTO job_rows (job_id, seq, row) VALUES (?, ?, ?)",
+                                   [(job_id, i, json.dumps(asdict(r))) for i, r in enumerate(rows)])
+            if candidates is not None:
+                self._conn.execute("INSERT OR REPLACE INTO job_candidates (job_id, batch) VALUES (?, ?)",
+                                   (job_id, json.dumps(candidates.to_dict())))
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, finished_at = ?, error = ?, summary = ?, metrics = ?, delta = ?,"
+                " rows_found = ?, progress = CASE WHEN ? = 'done' THEN 1.0 ELSE progress END WHERE job_id = ?",
+                (status, time.time(), error, json.dumps(summary) if summary is not None else None,
+                 json.dumps(metrics) if metrics is not None else None,
+                 json.dumps(delta) if delta is not None else None, len(rows), status, job_id))
+            self._conn.commit()
+
+    def requeue(self, job_id: int):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = 'queued', worker = NULL, progress = 0, progress_text = '', rows_found = 0"
+                " WHERE job_id = ? AND status = 'running'", (job_id,))
+            self._conn.execute("DELETE FROM job_rows WHERE job_id = ?", (job_id,))
+            self._conn.commit()
+
+    def recover_stale(self, stale_after: float = JOB_STALE_AFTER, max_attempts: int = JOB_MAX_ATTEMPTS) -> int:
+        """Re-queue (or fail, after max_attempts) running jobs whose worker stopped heartbeating."""
+        cutoff = time.time() - stale_after
+        with self._lock:
+            stale = self._conn.execute(
+                "SELECT job_id, attempts FROM jobs WHERE status = 'running' AND (worker IS NULL OR worker NOT IN"
+                " (SELECT worker_id FROM workers WHERE heartbeat_at >= ?))", (cutoff,)).fetchall()
+        for job_id, attempts in stale:
+            if attempts >= max_attempts:
+                self.finish(job_id, "failed", self.rows(job_id), error="worker stopped responding")
+            else:
+                self.requeue(job_id)
+        return len(stale)
+
+    def _job(self, row) -> Job:
+        d = dict(zip(self._JOB_COLS, row))
+        for key in ("params", "summary", "metrics", "delta"):
+            d[key] = json.loads(d[key]) if d[key] else ({} if key == "params" else None)
+        d["cancel_requested"] = bool(d["cancel_requested"])
+        return Job(**d)
+
+# ---------------- Worker ----------------
+def _scan_kwargs(params: dict) -> Dict[str, object]:
+    return {k: v for k, v in params.items() if k not in ("categories", "discover", "block_resources")}
+
+def run_job(queue: JobQueue, job: Job):
+    """Run one claimed job to a final state (done, cancelled or failed)."""
+    params = job.params
+    browser = core.amazon_browser()
+    browser.set_resource_blocking(core.ResourceBlockPolicy() if params.get("block_resources") else None)
+    fetched_before = len(browser.fetch_stats)
+    metrics = core.ScanMetrics()
+    rows: List[OpportunityRow] = []
+    status, error, summary, delta, candidates = "failed", None, None, None, None
+    events = None
+    try:
+        queue.update_progress(job.job_id, 0.0, "Preparing categories...", 0)
+        categories = params.get("categories") or core.discover_best_seller_categories(
+            max_categories=int(params.get("discover", 8)))
+        if not categories:
+            raise ValueError("no categories to scan")
+        events = core.iter_opportunities(categories, metrics=metrics, **_scan_kwargs(params))
+        last_write = 0.0
+        for ev in events:
+            if ev.kind == "row":
+                queue.add_row(job.job_id, len(rows), ev.row)
+                rows.append(ev.row)
+            elif ev.kind == "done":
+                summary = ev.summary.to_dict()
+                delta = delta_to_dict(ev.delta)
+                candidates = ev.candidates
+                status = "done"
+                break
+            now = time.monotonic()
+            if ev.kind == "row" or now - last_write >= PROGRESS_EVERY:
+                last_write = now
+                text = (f"Category {ev.category_index + 1}/{ev.category_total} · "
+                        f"product {ev.product_index}/{ev.product_total} · {ev.rows_found} found")
+                if queue.update_progress(job.job_id, ev.progress, text, ev.rows_found):
+                    status = "cancelled"
+                    queue.mark_cancelled(job.job_id)
+                    break
+    except Exception as e:
+        status, error = "failed", f"{type(e).__name__}: {e}"
+    finally:
+        if events is not None:
+            events.close()  # cancels outstanding fetches when we stopped early
+    page_stats = browser.stats_summary(last=len(browser.fetch_stats) - fetched_before)
+    if summary is None:
+        summary = {}
+    summary["amazon_pages"] = page_stats
+    summary["rate_limits"] = core.rate_limiter_snapshot()
+    queue.finish(job.job_id, status, core.sort_opportunities(rows), error=error, summary=summary,
+                 metrics=metrics.to_dict(), delta=delta, candidates=candidates)
+
+def _interrupt(signum, frame):
+    raise KeyboardInterrupt  # SIGTERM: stop like Ctrl-C, handing the current job back to the queue
+
+def run_worker(queue: JobQueue, poll: float = WORKER_POLL, once: bool = False, worker_id: Optional[str] = None):
+    """Serve jobs until stopped (SIGTERM/Ctrl-C); with once=True, exit when the queue is empty."""
+    worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+    stop = threading.Event()
+    current: Dict[str, Optional[int]] = {"job_id": None}
+
+    browser = core.amazon_browser()
+    info = {"pid": os.getpid(), "started_at": time.time()}
+
+    def beat():
+        while not stop.wait(WORKER_HEARTBEAT):
+            queue.heartbeat(worker_id, current["job_id"], info=dict(info, browser=browser.health()))
+
+    queue.heartbeat(worker_id, info=dict(info, browser=browser.health()))
+    threading.Thread(target=beat, name="worker-heartbeat", daemon=True).start()
+    if WORKER_WARM_BROWSER:  # the first scan then starts on a launched, logged-in browser
+        threading.Thread(target=browser.warm_up, name="browser-warm-up", daemon=True).start()
+    if threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGTERM, _interrupt)
+    try:
+        while True:
+            queue.recover_stale()
+            job = queue.claim(worker_id)
+            if job is None:
+                if once:
+                    return
+                time.sleep(poll)
+                continue
+            current["job_id"] = job.job_id
+            queue.heartbeat(worker_id, job.job_id)
+            try:
+                run_job(queue, job)
+            except KeyboardInterrupt:
+                queue.requeue(job.job_id)  # picked up again by the next worker
+                raise
+            finally:
+                current["job_id"] = None
+                queue.heartbeat(worker_id)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        queue.retire(worker_id)
+        browser.close()
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Background scan worker for the comparative-analysis app.")
+    ap.add_argument("--db", default=JOBS_PATH, help="job queue database (SCRAPER_JOBS_PATH)")
+    ap.add_argument("--poll", type=float, default=WORKER_POLL, help="seconds between queue polls when idle")
+    ap.add_argument("--once", action="store_true", help="exit once the queue is empty")
+    args = ap.parse_args(argv)
+    run_worker(JobQueue(args.db), poll=args.poll, once=args.once)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+import threading, time
+
+import arbitrage_core as core
+
+def _products(n):
+    return [core.AmazonProduct(title=f"Widget {i} Model {i}", asin=f"B0TEST{i:04d}", price_gbp=10.0, prime=False,
+                               rating=None, reviews_count=None, url=f"https://www.amazon.co.uk/dp/B0TEST{i:04d}",
+                               category_url="cat")
+            for i in range(n)]
+
+def test_close_mid_category_cancels_queued_lookups(monkeypatch):
+    started = []
+    lock = threading.Lock()
+
+    def slow_lookup(p, query, plan):
+        with lock:
+            started.append(p.asin)
+        time.sleep(0.5)
+        return core._LookupResult(None, None, True)
+
+    monkeypatch.setattr(core, "price_history", lambda: None)
+    monkeypatch.setattr(core, "scrape_amazon_bestsellers", lambda cat, max_items: _products(20))
+    monkeypatch.setattr(core, "_ebay_lookup", slow_lookup)
+    events = core.iter_opportunities(["cat"], concurrency=2, avoid_keywords=[])
+    for ev in events:
+        if ev.kind == "product":
+            break
+    t0 = time.perf_counter()
+    events.close()
+    assert time.perf_counter() - t0 < 0.4
+    time.sleep(0.6)  # lookups already running when closed finish; queued ones never start
+    assert len(started) <= 4
+
+def test_dropping_candidates_keeps_the_rows(monkeypatch):
+    def lookup(p, query, plan):
+        price = 30.0 if int(p.asin[-4:]) % 2 else 5.0
+        return core._LookupResult(core.EbayResult(p.title, price, 0.0, "https://www.ebay.co.uk/itm/1"), 20, True)
+
+    monkeypatch.setattr(core, "price_history", lambda: None)
+    monkeypatch.setattr(core, "scrape_amazon_bestsellers", lambda cat, max_items: _products(10))
+    monkeypatch.setattr(core, "_ebay_lookup", lookup)
+    runs = {}
+    for keep in (True, False):
+        events = list(core.iter_opportunities(["cat", "cat2"], concurrency=1, avoid_keywords=[], keep_candidates=keep))
+        runs[keep] = ([ev.row for ev in events if ev.kind == "row"], events[-1].candidates)
+    assert runs[False][0] == runs[True][0] and len(runs[False][0]) == 5
+    assert runs[False][1] is None and len(runs[True][1]) == 10
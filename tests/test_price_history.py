@@ -0,0 +1,11 @@
+import arbitrage_core as core
+
+def test_signals_fetched_under_other_lookup_settings_are_not_reused(tmp_path):
+    history = core.PriceHistory(str(tmp_path / "history.sqlite3"))
+    best = core.EbayResult("Widget", 12.0, 1.0, "https://www.ebay.co.uk/itm/1")
+    history.record("B0TEST0001", "widget", 5.0, best=best, price_checked=True, sold_recent=7,
+                   price_settings="results=8;match=0", sold_settings="match=0")
+    same = history.known("B0TEST0001", "widget", 5.0, price_settings="results=8;match=0", sold_settings="match=0")
+    assert same.best.price_gbp == 12.0 and same.sold_recent == 7
+    assert history.known("B0TEST0001", "widget", 5.0, price_settings="results=8;match=0.3",
+                         sold_settings="match=0.3") is None
@@ -0,0 +1,93 @@
+import email.utils, threading, types
+
+import pytest
+
+import arbitrage_core as core
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return 1_700_000_000.0 + self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(core, "time", types.SimpleNamespace(monotonic=clock.monotonic, time=clock.time))
+    monkeypatch.setattr(core, "random", types.SimpleNamespace(uniform=lambda a, b: b))  # always the top of the range
+    monkeypatch.setattr(core, "RATE_JITTER", 0.3)
+    monkeypatch.setattr(core, "BACKOFF_BASE", 2.0)
+    monkeypatch.setattr(core, "RATE_MAX_PAUSE", 120.0)
+    return clock
+
+def _limiter(**kw):
+    kw = dict(dict(rate=2.0, min_rate=0.1, max_rate=3.0, increase=0.5, decrease=0.5, burst=1.0), **kw)
+    return core.HostRateLimiter(**kw)
+
+def test_token_bucket_spaces_requests_with_jitter(clock):
+    lim = _limiter()
+    assert lim.reserve() == 0.0  # the burst token
+    assert lim.reserve() == pytest.approx(0.5 + 0.3 / 2.0)  # one interval, plus jitter of up to 30% of it
+    assert lim.reserve() == pytest.approx(1.0 + 0.3 / 2.0)  # queued behind the previous reservation
+    clock.now += 60
+    assert lim.reserve() == 0.0  # refilled, but never beyond the burst
+    assert lim.reserve() > 0
+
+def test_aimd_adapts_within_bounds(clock):
+    lim = _limiter()
+    for _ in range(5):
+        lim.on_success()
+    assert lim.rate == 3.0  # +0.5 per clean response, capped at max_rate
+    lim.on_throttle(0)
+    assert lim.rate == 1.5
+    for _ in range(10):
+        lim.on_throttle(0)
+    assert lim.rate == 0.1 and lim.throttles == 11  # halved per throttle, floored at min_rate
+
+def test_retry_after_pauses_the_host(clock):
+    lim = _limiter()
+    assert lim.on_throttle(7.0) == 7.0
+    assert lim.reserve() == pytest.approx(7.0 + 0.3 / 1.0)
+    assert lim.snapshot()["paused_for_s"] == 7.0
+    clock.now += 7.5
+    assert lim.snapshot()["paused_for_s"] == 0.0
+
+def test_backoff_without_retry_after_grows_until_a_success(clock):
+    lim = _limiter()
+    pauses = [lim.on_throttle() for _ in range(8)]
+    assert pauses[:4] == [3.0, 6.0, 12.0, 24.0]  # BACKOFF_BASE * 2**(n-1) * the top jitter of 1.5
+    assert max(pauses) == 120.0 * 1.5  # capped at RATE_MAX_PAUSE before the jitter
+    lim.on_success()
+    assert lim.on_throttle() == 3.0  # a clean response resets the exponent
+
+def test_retry_after_header_forms(clock):
+    when = email.utils.formatdate(clock.time() + 30, usegmt=True)
+    assert core._retry_after_seconds("12") == 12.0
+    assert core._retry_after_seconds(when) == pytest.approx(30.0, abs=1.0)
+    assert core._retry_after_seconds(email.utils.formatdate(clock.time() - 30, usegmt=True)) == 0.0
+    assert core._retry_after_seconds("soon") is None and core._retry_after_seconds(None) is None
+
+def test_concurrent_reservations_each_get_their_own_slot(clock, monkeypatch):
+    monkeypatch.setattr(core, "RATE_JITTER", 0.0)
+    lim = _limiter(rate=4.0, max_rate=4.0, burst=2.0)
+    waits, lock = [], threading.Lock()
+    barrier = threading.Barrier(8)
+
+    def reserve():
+        barrier.wait()
+        for _ in range(50):
+            w = lim.reserve()
+            with lock:
+                waits.append(w)
+
+    threads = [threading.Thread(target=reserve) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    # the clock is frozen: 2 burst slots, then one slot every 1/rate seconds, none handed out twice
+    assert sorted(waits) == pytest.approx([max(0, k - 1) / 4.0 for k in range(400)])
@@ -0,0 +1,68 @@
+import pytest
+import requests
+
+import arbitrage_core as core
+
+class FakeResponse:
+    def __init__(self, status, headers=None):
+        self.status_code, self.headers, self.content = status, headers or {}, b"<html></html>"
+
+class FakeSession:
+    def __init__(self, outcomes):
+        self.outcomes, self.calls = list(outcomes), 0
+
+    def get(self, url, headers=None, timeout=None):
+        self.calls += 1
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return FakeResponse(*outcome) if isinstance(outcome, tuple) else FakeResponse(outcome)
+
+class RecordingLimiter:
+    def __init__(self):
+        self.throttles, self.successes = [], 0
+
+    def acquire(self):
+        return 0.0
+
+    def on_throttle(self, retry_after=None):
+        self.throttles.append(retry_after)
+        return 0.0
+
+    def on_success(self):
+        self.successes += 1
+
+@pytest.fixture
+def fetch(monkeypatch):
+    limiter = RecordingLimiter()
+    monkeypatch.setattr(core, "host_limiter", lambda url: limiter)
+
+    def run(*outcomes):
+        session = FakeSession(outcomes)
+        monkeypatch.setattr(core, "_http_session", lambda url: session)
+        return session, limiter
+    return run
+
+@pytest.mark.parametrize("status", [400, 404, 410])
+def test_client_error_fails_at_once_without_slowing_the_host(fetch, status):
+    session, limiter = fetch(status)
+    with pytest.raises(core.FetchError, match=f"HTTP {status}"):
+        core._requests_get("https://www.ebay.co.uk/sch/i.html?_nkw=x")
+    assert session.calls == 1 and limiter.throttles == []
+
+def test_throttling_slows_the_host_and_honours_retry_after(fetch):
+    session, limiter = fetch((429, {"Retry-After": "7"}), 503, 200)
+    assert core._requests_get("https://www.ebay.co.uk/sch/i.html?_nkw=x").status_code == 200
+    assert limiter.throttles == [7.0, None] and limiter.successes == 1
+
+def test_server_errors_and_connection_errors_retry_without_decrease(fetch):
+    session, limiter = fetch(500, requests.ConnectionError("reset"), 504, 200)
+    assert core._requests_get("https://www.ebay.co.uk/sch/i.html?_nkw=x").status_code == 200
+    assert session.calls == 4 and limiter.throttles == []
+
+def test_last_attempt_403_is_not_retried(fetch, monkeypatch):
+    monkeypatch.setattr(core, "MAX_RETRIES", 2)
+    session, limiter = fetch(403, 403)
+    with pytest.raises(core.FetchError, match="HTTP 403"):
+        core._requests_get("https://www.ebay.co.uk/sch/i.html?_nkw=x")
+    assert session.calls == 2 and len(limiter.throttles) == 1
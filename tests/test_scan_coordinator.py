@@ -0,0 +1,88 @@
+import os, threading, time
+
+import arbitrage_core as core
+import scan_coordinator as sc
+
+def _scan(root, n=12):
+    return sc.ShardedScan.create(str(root), [f"https://www.amazon.co.uk/gp/bestsellers/c{i}" for i in range(n)],
+                                 {"max_items": 20}, scan_id="s")
+
+def _expire(scan, shard_id):
+    path = os.path.join(scan._dir("leases"), shard_id)
+    os.utime(path, (time.time() - 1000, time.time() - 1000))
+
+def test_concurrent_workers_never_take_a_shard_twice(tmp_path, monkeypatch):
+    scan = _scan(tmp_path, n=40)
+    runs, lock = [], threading.Lock()
+
+    def run_shard(scan, shard):
+        with lock:
+            runs.append(shard.shard_id)
+        time.sleep(0.005)
+        return {"rows": [], "candidates": {}, "summary": {}}
+
+    monkeypatch.setattr(sc, "run_shard", run_shard)
+    barrier = threading.Barrier(4)
+    workers = [threading.Thread(target=lambda i=i: (barrier.wait(), sc.work(str(tmp_path), "s", f"w{i}")))
+               for i in range(4)]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    assert sorted(runs) == sorted(set(runs)) and len(runs) == 40
+    assert scan.status()["done"] == 40 and scan.finished
+
+def test_expired_lease_goes_back_to_todo_with_its_attempt_counted(tmp_path):
+    scan = _scan(tmp_path, n=1)
+    shard = scan.lease("w1")
+    assert shard.attempt == 1 and scan.lease("w2") is None
+    assert scan.reclaim_expired(ttl=60) == 0  # still fresh
+    _expire(scan, shard.shard_id)
+    assert scan.reclaim_expired(ttl=60) == 1
+    assert scan.status()["todo"] == 1 and not scan.renew(shard, "w1")
+    again = scan.lease("w2")
+    assert again.shard_id == shard.shard_id and again.attempt == 2
+
+def test_shard_fails_after_max_attempts(tmp_path, monkeypatch):
+    monkeypatch.setattr(sc, "SHARD_MAX_ATTEMPTS", 2)
+    scan = _scan(tmp_path, n=1)
+    for _ in range(2):
+        shard = scan.lease("w1")
+        _expire(scan, shard.shard_id)
+        scan.reclaim_expired(ttl=60)
+    assert scan.lease("w1") is None
+    assert scan.status()["failed"] == 1 and scan.finished
+    assert "lease expired" in scan.merge().failed[shard.shard_id]
+
+def test_late_complete_from_a_reclaimed_lease_is_not_rerun(tmp_path, monkeypatch):
+    scan = _scan(tmp_path, n=1)
+    shard = scan.lease("slow")
+    _expire(scan, shard.shard_id)
+    scan.reclaim_expired(ttl=60)
+    scan.complete(shard, "slow", {"rows": [], "candidates": {}, "summary": {"products": 3}})
+    runs = []
+    monkeypatch.setattr(sc, "run_shard", lambda scan, shard: runs.append(shard.shard_id))
+    assert sc.work(str(tmp_path), "s", "other") == 0 and runs == []
+    assert scan.status() == {"shards": 1, "todo": 0, "leased": 0, "done": 1, "failed": 0}
+
+def test_category_snapshot_is_loaded_once(tmp_path, monkeypatch):
+    scan = _scan(tmp_path, n=1)
+    loads = []
+    product = core.AmazonProduct(title="Widget", asin="B0TEST0001", price_gbp=9.5, prime=True, rating=None,
+                                 reviews_count=None, url="https://www.amazon.co.uk/dp/B0TEST0001", category_url="c0")
+
+    def scrape(category, max_items):
+        loads.append(category)
+        time.sleep(0.2)
+        return [product]
+
+    monkeypatch.setattr(core, "scrape_amazon_bestsellers", scrape)
+    monkeypatch.setattr(sc, "WORK_POLL", 0.02)
+    got = []
+    threads = [threading.Thread(target=lambda: got.append(scan.category_products(scan.categories[0])))
+               for _ in range(3)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(loads) == 1 and got == [[product]] * 3
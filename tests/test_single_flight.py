@@ -0,0 +1,44 @@
+import threading, time
+
+import arbitrage_core as core
+
+def test_concurrent_calls_share_one_execution_and_are_then_forgotten():
+    flight, calls, release = core.SingleFlight(), [], threading.Event()
+
+    def fetch(url):
+        calls.append(url)
+        release.wait(2)
+        return "<html>" + url
+
+    threads = [threading.Thread(target=flight.do, args=("k", fetch, "u")) for _ in range(4)]
+    for t in threads:
+        t.start()
+    deadline = time.monotonic() + 2
+    while flight.shared < 3 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    release.set()
+    for t in threads:
+        t.join()
+    assert calls == ["u"] and flight.shared == 3
+    assert not flight._calls and not flight._done  # no page outlives its fetch
+    assert flight.do("k", fetch, "u") == "<html>u" and len(calls) == 2
+
+def test_remembered_results_answer_later_calls():
+    flight, calls = core.SingleFlight(), []
+    parse = lambda v: calls.append(v) or v * 2
+    assert flight.do("k", parse, 21, remember=True) == 42
+    assert flight.do("k", parse, 21, remember=True) == 42
+    assert calls == [21] and flight.shared == 1
+
+def test_failed_call_is_not_kept():
+    flight = core.SingleFlight()
+
+    def boom():
+        raise core.FetchError("down")
+
+    for _ in range(2):
+        try:
+            flight.do("k", boom, remember=True)
+        except core.FetchError:
+            pass
+    assert not flight._calls and not flight._done and flight.shared == 0
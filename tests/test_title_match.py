@@ -0,0 +1,17 @@
+import arbitrage_core as core
+
+def test_model_numbers_match_across_hyphens_and_spaces():
+    scores = core.title_match_scores("Sony WH-1000XM4 Wireless Noise Cancelling Headphones",
+                                     ["Sony WH1000XM4 Wireless", "Sony WH-1000XM5 Wireless Headphones",
+                                      "Bose QC45 headphones"])
+    assert scores[0] > scores[1] > scores[2]
+
+def test_long_amazon_title_still_matches_short_listing():
+    ref = ("Anker 735 Charger (Nano II 65W), 3-Port Fast Compact Foldable GaN II Charger for MacBook Pro/Air, "
+           "iPad Pro, Galaxy S20/S10, Dell XPS 13, Note 20/10+, iPhone 13/Pro, Pixel, and More")
+    scores = core.title_match_scores(ref, ["Genuine Anker 735 Charger (Nano II 65W) 3 Port",
+                                           "Ugreen Nexode 65W USB C Charger 3 Port GaN"])
+    assert scores[0] > 0.4 > scores[1]
+
+def test_asin_in_listing_is_a_full_match():
+    assert core.title_match_scores("Anything", ["Spare part for B0ABCDEFGH"], asin="B0ABCDEFGH")[0] == 1.0